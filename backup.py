@@ -0,0 +1,91 @@
+from pyrogram import filters
+from shared import app, ADMINS, DATABASE_CHANNEL, BACKUP_KEEP
+from database import DB_FILE, DATABASE_FILES, backup_database
+from files import format_file_size
+import asyncio
+import datetime
+import gzip
+import logging
+import shutil
+import time
+
+logger = logging.getLogger(__name__)
+
+BACKUP_DIR = DB_FILE.parent.joinpath('backups')
+BACKUP_DIR.mkdir(parents=True, exist_ok=True)
+
+# Only one backup at a time, whether scheduled or requested by an admin
+_backup_lock = asyncio.Lock()
+
+def _snapshot_database(db, stamp):
+    """Back up, gzip and rotate one database file"""
+    stem = DATABASE_FILES[db].stem
+    raw_path = BACKUP_DIR.joinpath(f"{stem}-{stamp}.db")
+    gz_path = raw_path.with_name(raw_path.name + ".gz")
+
+    backup_database(raw_path, db)
+    try:
+        with open(raw_path, 'rb') as src, gzip.open(gz_path, 'wb', compresslevel=6) as dst:
+            shutil.copyfileobj(src, dst, length=1024 * 1024)
+    finally:
+        raw_path.unlink(missing_ok=True)
+
+    # Keep the newest BACKUP_KEEP snapshots
+    snapshots = sorted(BACKUP_DIR.glob(f"{stem}-*.db.gz"))
+    for old in snapshots[:-BACKUP_KEEP] if BACKUP_KEEP > 0 else []:
+        old.unlink(missing_ok=True)
+    return gz_path
+
+def _create_snapshot():
+    """Snapshot every database file; runs on a worker thread"""
+    stamp = datetime.datetime.now().strftime("%Y%m%d-%H%M%S")
+    return [_snapshot_database(db, stamp) for db in DATABASE_FILES]
+
+def _describe(paths):
+    return ", ".join(f"{path.name} ({format_file_size(path.stat().st_size)})" for path in paths)
+
+async def create_backup():
+    """Take compressed online snapshots without blocking the event loop; returns their paths"""
+    async with _backup_lock:
+        started = time.perf_counter()
+        loop = asyncio.get_running_loop()
+        paths = await loop.run_in_executor(None, _create_snapshot)
+        logger.info(f"Database backup written: {_describe(paths)} in {(time.perf_counter() - started):.1f}s")
+        return paths
+
+async def scheduled_backup():
+    """Maintenance job wrapper"""
+    paths = await create_backup()
+    return f"snapshots {_describe(paths)}"
+
+@app.on_message(filters.command("backup") & filters.private)
+async def backup_handler(client, message):
+    """Take a database backup now (Admin only); `/backup upload` also posts it to the database channel"""
+    if message.from_user.id not in ADMINS:
+        await message.reply("Admin access required.")
+        return
+
+    upload = len(message.command) > 1 and message.command[1] == "upload"
+    status = await message.reply("Creating backup...")
+    try:
+        paths = await create_backup()
+        text = "Backup created: " + ", ".join(
+            f"`{path.name}` ({format_file_size(path.stat().st_size)})" for path in paths
+        )
+
+        if upload:
+            if not DATABASE_CHANNEL:
+                text += "\nUpload skipped: database channel not configured."
+            else:
+                for path in paths:
+                    await client.send_document(
+                        DATABASE_CHANNEL,
+                        str(path),
+                        caption=f"Database backup {path.name}"
+                    )
+                text += "\nUploaded to the database channel."
+
+        await status.edit_text(text)
+    except Exception as e:
+        logger.error(f"Error creating backup: {e}")
+        await status.edit_text(f"Backup failed: {str(e)}")
@@ -0,0 +1,150 @@
+import asyncio
+import logging
+from database import fetch_all
+from pager import Page, seek
+
+logger = logging.getLogger(__name__)
+
+# Display order for resolutions; anything else sorts after these alphabetically
+RESOLUTION_ORDER = {'1080p': 1, '720p': 2, '480p': 3}
+
+def resolution_sort_key(resolution):
+    """Sort key matching the resolution order used across the bot"""
+    return (RESOLUTION_ORDER.get(resolution, 4), resolution)
+
+def _name_key(name):
+    """Case-insensitive sort key for series names; the name itself breaks ties"""
+    return (name.casefold(), name)
+
+class SeriesCatalog:
+    """Process-wide cache of series -> resolution -> file count.
+
+    Loaded once from SQLite and then patched in place by the admin write
+    paths. Every change bumps `version`, so callers can tell whether data
+    they derived from the catalog is stale.
+    """
+
+    def __init__(self):
+        self.version = 0
+        self._series = {}
+        self._sizes = {}
+        self._sorted_names = []
+        self._sort_keys = []
+        self._initials = []
+        self._sorted_version = -1
+        self._loaded = False
+        self._load_lock = asyncio.Lock()
+
+    @property
+    def loaded(self):
+        return self._loaded
+
+    async def load(self):
+        """(Re)load the whole catalog from the trigger-maintained summary table"""
+        rows = await fetch_all('summary.all')
+        series = {}
+        sizes = {}
+        for series_name, resolution, count, total_size in rows:
+            series.setdefault(series_name, {})[resolution] = count
+            sizes[series_name] = sizes.get(series_name, 0) + total_size
+        self._series = series
+        self._sizes = sizes
+        self._loaded = True
+        self.version += 1
+        logger.info(f"Catalog loaded: {len(series)} series (version {self.version})")
+
+    async def ensure_loaded(self):
+        """Load the catalog if it is cold"""
+        if self._loaded:
+            return
+        async with self._load_lock:
+            if not self._loaded:
+                await self.load()
+
+    def add_file(self, series_name, resolution, size_bytes=0, count=1):
+        """Record newly inserted files"""
+        if not self._loaded:
+            return
+        resolutions = self._series.setdefault(series_name, {})
+        resolutions[resolution] = resolutions.get(resolution, 0) + count
+        self._sizes[series_name] = self._sizes.get(series_name, 0) + (size_bytes or 0)
+        self.version += 1
+
+    def remove_series(self, series_name):
+        """Forget a deleted series"""
+        if not self._loaded:
+            return
+        self._sizes.pop(series_name, None)
+        if self._series.pop(series_name, None) is not None:
+            self.version += 1
+
+    def _names(self):
+        if self._sorted_version != self.version:
+            # Case-insensitive order, so A-Z jumps land on lower-case names too
+            self._sorted_names = sorted(self._series, key=_name_key)
+            self._sort_keys = [_name_key(name) for name in self._sorted_names]
+            self._initials = sorted({name[:1].upper() for name in self._sorted_names if name})
+            self._sorted_version = self.version
+        return self._sorted_names
+
+    async def series_list(self):
+        """[(series_name, file_count)] ordered by name (case-insensitively)"""
+        await self.ensure_loaded()
+        return [(name, sum(self._series[name].values())) for name in self._names()]
+
+    async def series_page(self, limit, after=None, before=None, start_at=None):
+        """Keyset page of (series_name, file_count) ordered by name (case-insensitively)"""
+        await self.ensure_loaded()
+        names = self._names()
+        start, end = seek(
+            self._sort_keys, limit,
+            after=_name_key(after) if after is not None else None,
+            before=_name_key(before) if before is not None else None,
+            start_at=(start_at.casefold(), '') if start_at is not None else None
+        )
+        items = [(name, sum(self._series[name].values())) for name in names[start:end]]
+        return Page(items, start, len(names))
+
+    async def initials(self):
+        """Distinct upper-cased first characters of series names, for A-Z jumps"""
+        await self.ensure_loaded()
+        self._names()
+        return self._initials
+
+    async def resolutions(self, series_name):
+        """[(resolution, file_count)] for a series in display order"""
+        await self.ensure_loaded()
+        resolutions = self._series.get(series_name, {})
+        return sorted(resolutions.items(), key=lambda item: resolution_sort_key(item[0]))
+
+    async def file_count(self, series_name):
+        """Number of files stored for a series"""
+        await self.ensure_loaded()
+        return sum(self._series.get(series_name, {}).values())
+
+    async def rows(self):
+        """[(series_name, resolution, file_count)] ordered by series and resolution"""
+        await self.ensure_loaded()
+        return [
+            (name, resolution, count)
+            for name in self._names()
+            for resolution, count in sorted(self._series[name].items())
+        ]
+
+    async def totals(self):
+        """(series_count, file_count, total_size_bytes) across the catalog"""
+        await self.ensure_loaded()
+        file_count = sum(sum(r.values()) for r in self._series.values())
+        return len(self._series), file_count, sum(self._sizes.values())
+
+# Process-wide catalog instance
+catalog = SeriesCatalog()
+
+async def seasons(series_name, resolution):
+    """[(season_num, file_count)] of one resolution in season order (episodes without a season are left out)"""
+    return await fetch_all('files.seasons', (series_name, resolution))
+
+async def season_episodes(series_name, resolution, season_num):
+    """Distinct episode numbers of one season in order"""
+    rows = await fetch_all('files.season_episodes', (series_name, resolution, season_num, season_num))
+    return [episode_num for episode_num, in rows]
@@ -1,43 +1,175 @@
 import sqlite3
 import logging
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import functools
+import queue
 import threading
+import time
 import atexit
+from queries import QUERIES, query_database
+from query_stats import query_stats
 
 logger = logging.getLogger(__name__)
 
-# Database connection
+# Database files: the catalog (files, mappings, summaries) and telemetry
+# (download_stats and its rollups) live apart, so append-heavy stats writes
+# never contend with catalog reads/writes or bloat the catalog's WAL.
 DB_FILE = Path(__file__).parent.joinpath('data', 'files.db')
+TELEMETRY_DB_FILE = DB_FILE.with_name('telemetry.db')
 DB_FILE.parent.mkdir(parents=True, exist_ok=True)
 
-# Thread-safe database connection
+CATALOG = 'catalog'
+TELEMETRY = 'telemetry'
+DATABASE_FILES = {CATALOG: DB_FILE, TELEMETRY: TELEMETRY_DB_FILE}
+
+# Per-database PRAGMAs: the catalog is read-heavy and keeps a short WAL for its
+# readers; telemetry is append-only and checkpoints in larger batches.
+DATABASE_PRAGMAS = {
+    CATALOG: (
+        "synchronous=NORMAL",
+        "cache_size=10000",
+        "wal_autocheckpoint=1000",
+    ),
+    TELEMETRY: (
+        "synchronous=NORMAL",
+        "cache_size=2000",
+        "wal_autocheckpoint=4000",
+        "journal_size_limit=33554432",
+    ),
+}
+
+# Checkpoint mode the maintenance job uses for each database
+CHECKPOINT_QUERIES = {
+    CATALOG: 'maintenance.checkpoint',
+    TELEMETRY: 'maintenance.checkpoint_passive',
+}
+
+# Read-only connections kept open for concurrent SELECTs
+READER_POOL_SIZES = {CATALOG: 4, TELEMETRY: 2}
+# Prepared statements cached per pooled connection
+STATEMENT_CACHE_SIZE = 256
+
+# Thread-safe database connections
 _thread_local = threading.local()
 
-def get_connection():
-    """Get thread-local database connection"""
-    if not hasattr(_thread_local, 'connection'):
-        _thread_local.connection = sqlite3.connect(
-            str(DB_FILE), 
-            check_same_thread=False,
-            timeout=30.0
-        )
-        # Enable WAL mode for better concurrent access
-        _thread_local.connection.execute("PRAGMA journal_mode=WAL")
-        _thread_local.connection.execute("PRAGMA synchronous=NORMAL")
-        _thread_local.connection.execute("PRAGMA cache_size=10000")
-        _thread_local.connection.execute("PRAGMA temp_store=memory")
-    return _thread_local.connection
-
-def get_cursor():
+def _bind_thread(db):
+    """Executor initializer: pin a worker thread to one database"""
+    _thread_local.db = db
+
+def _open_connection(db=CATALOG, read_only=False):
+    """Open a configured connection to one of the database files"""
+    connection = sqlite3.connect(
+        str(DATABASE_FILES[db]), 
+        check_same_thread=False,
+        timeout=30.0,
+        cached_statements=STATEMENT_CACHE_SIZE
+    )
+    # Enable WAL mode for better concurrent access
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA temp_store=memory")
+    for pragma in DATABASE_PRAGMAS[db]:
+        connection.execute(f"PRAGMA {pragma}")
+    if read_only:
+        connection.execute("PRAGMA query_only=ON")
+        # Catalog readers see telemetry as `telemetry.<table>` for cross-database SELECTs
+        if db == CATALOG:
+            connection.execute("ATTACH DATABASE ? AS telemetry", (str(TELEMETRY_DB_FILE),))
+    return connection
+
+def get_connection(db=None):
+    """Get thread-local database connection (the writer connection on a writer thread)"""
+    db = db or getattr(_thread_local, 'db', CATALOG)
+    if not hasattr(_thread_local, 'connections'):
+        _thread_local.connections = {}
+    if db not in _thread_local.connections:
+        _thread_local.connections[db] = _open_connection(db)
+    return _thread_local.connections[db]
+
+def get_cursor(db=None):
     """Get cursor from thread-local connection"""
-    return get_connection().cursor()
+    return get_connection(db).cursor()
+
+class ReaderPool:
+    """Fixed-size pool of query_only connections shared by the reader threads"""
 
-# Global connection and cursor for backward compatibility
-conn = get_connection()
-cursor = get_cursor()
+    def __init__(self, db, size):
+        self.db = db
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.acquisitions = 0
+        self.waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    # Waits shorter than this are scheduling noise, not saturation
+    WAIT_THRESHOLD = 0.001
+
+    def acquire(self, submitted=None):
+        """Borrow a reader connection, blocking while all are busy.
+
+        `submitted` is when the read was queued, so time spent waiting for a
+        free reader thread counts as pool wait too.
+        """
+        try:
+            connection = self._idle.get_nowait()
+        except queue.Empty:
+            connection = None
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    connection = _open_connection(self.db, read_only=True)
+            if connection is None:
+                connection = self._idle.get()
+        waited = time.perf_counter() - submitted if submitted is not None else 0.0
+        with self._lock:
+            self.acquisitions += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+            if waited > self.WAIT_THRESHOLD:
+                self.waits += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+        return connection
+
+    def release(self, connection):
+        """Return a borrowed connection to the pool"""
+        with self._lock:
+            self.in_use -= 1
+        self._idle.put(connection)
+
+    def close_all(self):
+        """Close every idle reader connection"""
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+            with self._lock:
+                self._created -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'in_use': self.in_use,
+                'peak_in_use': self.peak_in_use,
+                'acquisitions': self.acquisitions,
+                'waits': self.waits,
+                'avg_wait_ms': (self.total_wait / self.waits * 1000) if self.waits else 0.0,
+                'max_wait_ms': self.max_wait * 1000,
+            }
+
+reader_pools = {db: ReaderPool(db, size) for db, size in READER_POOL_SIZES.items()}
 
 def initialize_database():
-    """Initialize database with required tables"""
+    """Initialize the catalog database with required tables"""
     try:
         local_conn = get_connection()
         local_cursor = local_conn.cursor()
@@ -69,17 +201,6 @@ def initialize_database():
             )
         """)
         
-        # Download statistics
-        local_cursor.execute("""
-            CREATE TABLE IF NOT EXISTS download_stats (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                user_id INTEGER NOT NULL,
-                series_name TEXT NOT NULL,
-                file_id TEXT NOT NULL,
-                downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        """)
-        
         # Schema version table
         local_cursor.execute("""
             CREATE TABLE IF NOT EXISTS schema_version (
@@ -94,9 +215,6 @@ def initialize_database():
         local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_message_id ON files(message_id)")
         local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_file_id ON files(file_id)")
         local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_hash ON series_mapping(hash)")
-        local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_user_downloads ON download_stats(user_id)")
-        local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_series ON download_stats(series_name)")
-        local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_time ON download_stats(downloaded_at)")
         
         local_conn.commit()
         logger.info("Database initialized successfully")
@@ -105,6 +223,40 @@ def initialize_database():
         logger.error(f"Database initialization failed: {e}")
         raise
 
+def initialize_telemetry():
+    """Initialize the telemetry database (download_stats and its rollups)"""
+    try:
+        local_conn = get_connection(TELEMETRY)
+        local_cursor = local_conn.cursor()
+        
+        # Download statistics
+        local_cursor.execute("""
+            CREATE TABLE IF NOT EXISTS download_stats (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER NOT NULL,
+                series_name TEXT NOT NULL,
+                file_id TEXT NOT NULL,
+                downloaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Covers the "new only" anti-join; its user_id prefix replaces the old idx_user_downloads
+        local_cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_user_series_files
+            ON download_stats(user_id, series_name, file_id)
+        """)
+        local_cursor.execute("DROP INDEX IF EXISTS idx_user_downloads")
+        local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_series ON download_stats(series_name)")
+        local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_download_time ON download_stats(downloaded_at)")
+        
+        _create_rollup_tables(local_cursor)
+        
+        local_conn.commit()
+        logger.info("Telemetry database initialized successfully")
+        
+    except Exception as e:
+        logger.error(f"Telemetry database initialization failed: {e}")
+        raise
+
 def get_schema_version():
     """Get current schema version"""
     try:
@@ -133,57 +285,580 @@ def set_schema_version(v):
     except Exception as e:
         logger.error(f"Error setting schema version: {e}")
 
-def execute_query(query, params=None, fetch_one=False, fetch_all=False):
-    """Execute a database query with proper error handling"""
+# Queries slower than this are logged with their EXPLAIN QUERY PLAN
+SLOW_QUERY_MS = 100
+
+slow_query_logger = logging.getLogger("slow_queries")
+
+def _record_query(local_conn, name, sql, params, started, rows):
+    """Feed per-query stats and log slow executions with their plan"""
+    elapsed = time.perf_counter() - started
+    query_stats.record(name, elapsed, rows)
+    if elapsed * 1000 < SLOW_QUERY_MS:
+        return
     try:
-        local_conn = get_connection()
+        plan = [row[-1] for row in local_conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())]
+    except Exception as e:
+        plan = [f"(plan unavailable: {e})"]
+    query_stats.record_slow(name, elapsed, params, plan)
+    slow_query_logger.warning(
+        f"Slow query {name}: {elapsed * 1000:.1f} ms, params={params!r}, plan: {' | '.join(plan)}"
+    )
+
+def execute_query(name, params=None, fetch_one=False, fetch_all=False, connection=None):
+    """Execute a named query from the registry with timing and error handling"""
+    sql = QUERIES[name]
+    try:
+        local_conn = connection or get_connection(query_database(name))
         local_cursor = local_conn.cursor()
         
-        if params:
-            local_cursor.execute(query, params)
-        else:
-            local_cursor.execute(query)
+        started = time.perf_counter()
+        local_cursor.execute(sql, params or ())
             
         if fetch_one:
-            return local_cursor.fetchone()
+            result = local_cursor.fetchone()
+            rows = 1 if result else 0
         elif fetch_all:
-            return local_cursor.fetchall()
+            result = local_cursor.fetchall()
+            rows = len(result)
+        else:
+            local_conn.commit()
+            result = rows = local_cursor.rowcount
         
-        local_conn.commit()
-        return local_cursor.rowcount
+        _record_query(local_conn, name, sql, params, started, rows)
+        return result
         
     except Exception as e:
         logger.error(f"Database query error: {e}")
-        logger.error(f"Query: {query}")
+        logger.error(f"Query: {name}")
         logger.error(f"Params: {params}")
         raise
 
+class TransactionCursor:
+    """Handed to transaction bodies; runs registry queries by name with timing"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.cursor()
+
+    def _run(self, name, params, many=False):
+        sql = QUERIES[name]
+        started = time.perf_counter()
+        if many:
+            self.cursor.executemany(sql, params)
+        else:
+            self.cursor.execute(sql, params or ())
+        return sql, started
+
+    def execute(self, name, params=None):
+        """Run a write statement and return the affected row count"""
+        sql, started = self._run(name, params)
+        _record_query(self.connection, name, sql, params, started, self.cursor.rowcount)
+        return self.cursor.rowcount
+
+    def executemany(self, name, seq_of_params):
+        """Run a write statement for every parameter tuple"""
+        sql, started = self._run(name, seq_of_params, many=True)
+        query_stats.record(name, time.perf_counter() - started, self.cursor.rowcount)
+        return self.cursor.rowcount
+
+    def fetch_one(self, name, params=None):
+        sql, started = self._run(name, params)
+        row = self.cursor.fetchone()
+        _record_query(self.connection, name, sql, params, started, 1 if row else 0)
+        return row
+
+    def fetch_all(self, name, params=None):
+        sql, started = self._run(name, params)
+        rows = self.cursor.fetchall()
+        _record_query(self.connection, name, sql, params, started, len(rows))
+        return rows
+
+# Handlers await these helpers instead of blocking the event loop on SQLite.
+# Each database has its own reader threads (one per pooled reader connection)
+# and a single writer thread whose executor queue is that database's write
+# queue, so telemetry flushes never wait behind catalog writes.
+_reader_executors = {
+    db: ThreadPoolExecutor(
+        max_workers=size, thread_name_prefix=f"sqlite-{db}-reader",
+        initializer=_bind_thread, initargs=(db,)
+    )
+    for db, size in READER_POOL_SIZES.items()
+}
+_writer_executors = {
+    db: ThreadPoolExecutor(
+        max_workers=1, thread_name_prefix=f"sqlite-{db}-writer",
+        initializer=_bind_thread, initargs=(db,)
+    )
+    for db in DATABASE_FILES
+}
+_write_queue_depth = {db: 0 for db in DATABASE_FILES}
+_writes_completed = {db: 0 for db in DATABASE_FILES}
+
+async def run_db(func, *args, db=CATALOG, **kwargs):
+    """Run a blocking database callable on the writer thread of `db`"""
+    loop = asyncio.get_running_loop()
+    _write_queue_depth[db] += 1
+    try:
+        return await loop.run_in_executor(_writer_executors[db], functools.partial(func, *args, **kwargs))
+    finally:
+        _write_queue_depth[db] -= 1
+        _writes_completed[db] += 1
+
+def _run_read(name, params, fetch_one, submitted):
+    pool = reader_pools[_thread_local.db]
+    connection = pool.acquire(submitted)
+    try:
+        return execute_query(name, params, fetch_one=fetch_one, fetch_all=not fetch_one, connection=connection)
+    finally:
+        pool.release(connection)
+
+async def run_read(name, params=None, fetch_one=False):
+    """Run a named SELECT on a pooled read-only connection of the query's database"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        _reader_executors[query_database(name) or CATALOG], _run_read, name, params, fetch_one, time.perf_counter()
+    )
+
+async def fetch_one(name, params=None):
+    """Run a named SELECT and return the first row"""
+    return await run_read(name, params, fetch_one=True)
+
+async def fetch_all(name, params=None):
+    """Run a named SELECT and return all rows"""
+    return await run_read(name, params)
+
+async def execute(name, params=None):
+    """Run a named write statement, commit it and return the affected row count"""
+    return await run_db(execute_query, name, params, db=query_database(name) or CATALOG)
+
+def _run_transaction(func):
+    """Call func(TransactionCursor) inside a transaction on the current thread"""
+    local_conn = get_connection()
+    try:
+        result = func(TransactionCursor(local_conn))
+        local_conn.commit()
+        return result
+    except Exception:
+        local_conn.rollback()
+        raise
+
+async def transaction(func, db=CATALOG):
+    """Run func(tx) atomically on the writer thread of `db` and return its result"""
+    return await run_db(_run_transaction, func, db=db)
+
+def backup_database(target_path, db=CATALOG, pages=1024, sleep=0.01):
+    """Copy a consistent snapshot of one live database into target_path.
+
+    Uses the SQLite online backup API from its own read-only connection,
+    copying `pages` pages per step and sleeping between steps so the writer
+    is never blocked for long. Blocking: call it from a worker thread.
+    """
+    source = _open_connection(db, read_only=True)
+    target = sqlite3.connect(str(target_path))
+    try:
+        source.backup(target, pages=pages, sleep=sleep)
+    finally:
+        target.close()
+        source.close()
+
 def close_connections():
-    """Close all database connections"""
+    """Close this thread's database connections"""
     try:
-        if hasattr(_thread_local, 'connection'):
-            _thread_local.connection.close()
-            delattr(_thread_local, 'connection')
+        for connection in getattr(_thread_local, 'connections', {}).values():
+            connection.close()
+        _thread_local.connections = {}
         logger.info("Database connections closed")
     except Exception as e:
         logger.error(f"Error closing database connections: {e}")
 
+def pool_stats(db=CATALOG):
+    """Reader pool saturation/wait times and writer queue depth for one database"""
+    stats = reader_pools[db].stats()
+    stats['write_queue_depth'] = _write_queue_depth[db]
+    stats['writes'] = _writes_completed[db]
+    return stats
+
+async def close_database():
+    """Close the writer and reader connections of every database (call on bot shutdown)"""
+    for db in DATABASE_FILES:
+        await run_db(close_connections, db=db)
+        reader_pools[db].close_all()
+
 # Register cleanup function
 atexit.register(close_connections)
 
+def code_number(code):
+    """Numeric part of a season/episode code like 'S02' or 'E10' (None if absent)"""
+    if not code:
+        return None
+    digits = code[1:] if code[:1].isalpha() else code
+    try:
+        return int(digits)
+    except ValueError:
+        return None
+
+_SIZE_UNITS = {'B': 1, 'KB': 1024, 'MB': 1024 ** 2, 'GB': 1024 ** 3, 'TB': 1024 ** 4}
+
+def _parse_size(text):
+    """Bytes from a formatted size like '350.2 MB' (approximate, None if unknown)"""
+    try:
+        value, unit = text.split()
+        return int(float(value) * _SIZE_UNITS[unit.upper()])
+    except (AttributeError, ValueError, KeyError):
+        return None
+
+def _parse_duration(text):
+    """Seconds from a formatted duration like '42:07' (None if empty)"""
+    try:
+        minutes, seconds = text.split(':')
+        return int(minutes) * 60 + int(seconds)
+    except (AttributeError, ValueError):
+        return None
+
+MIGRATION_BATCH_SIZE = 500
+
+def _migrate_to_v2(local_conn):
+    """Add typed season/episode/size/duration columns and the episode ordering index"""
+    local_cursor = local_conn.cursor()
+    existing = {row[1] for row in local_cursor.execute("PRAGMA table_info(files)")}
+    for column in ('season_num', 'episode_num', 'size_bytes', 'duration_seconds'):
+        if column not in existing:
+            local_cursor.execute(f"ALTER TABLE files ADD COLUMN {column} INTEGER")
+    local_conn.commit()
+
+    # Backfill in batches so a large table never holds the write lock for long
+    last_id = 0
+    backfilled = 0
+    while True:
+        rows = local_cursor.execute(
+            "SELECT id, season, episode, file_size, duration FROM files WHERE id > ? ORDER BY id LIMIT ?",
+            (last_id, MIGRATION_BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        local_cursor.executemany(
+            "UPDATE files SET season_num = ?, episode_num = ?, size_bytes = ?, duration_seconds = ? WHERE id = ?",
+            [
+                (code_number(season), code_number(episode), _parse_size(file_size), _parse_duration(duration), row_id)
+                for row_id, season, episode, file_size, duration in rows
+            ]
+        )
+        local_conn.commit()
+        last_id = rows[-1][0]
+        backfilled += len(rows)
+
+    local_cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_episode_order
+        ON files(series_name, resolution, season_num, episode_num)
+    """)
+    local_conn.commit()
+    logger.info(f"Backfilled typed columns for {backfilled} files")
+
+def _migrate_to_v3(local_conn):
+    """Add the trigger-maintained per-series/resolution summary table"""
+    local_cursor = local_conn.cursor()
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS series_summary (
+            series_name TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            file_count INTEGER NOT NULL DEFAULT 0,
+            total_size INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (series_name, resolution)
+        ) WITHOUT ROWID
+    """)
+    local_cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_summary_insert AFTER INSERT ON files
+        BEGIN
+            INSERT INTO series_summary (series_name, resolution, file_count, total_size)
+            VALUES (NEW.series_name, NEW.resolution, 1, COALESCE(NEW.size_bytes, 0))
+            ON CONFLICT(series_name, resolution) DO UPDATE SET
+                file_count = file_count + 1,
+                total_size = total_size + excluded.total_size;
+        END
+    """)
+    local_cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_summary_delete AFTER DELETE ON files
+        BEGIN
+            UPDATE series_summary
+            SET file_count = file_count - 1,
+                total_size = total_size - COALESCE(OLD.size_bytes, 0)
+            WHERE series_name = OLD.series_name AND resolution = OLD.resolution;
+            DELETE FROM series_summary
+            WHERE series_name = OLD.series_name AND resolution = OLD.resolution AND file_count <= 0;
+        END
+    """)
+    local_cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_files_summary_update
+        AFTER UPDATE OF series_name, resolution, size_bytes ON files
+        BEGIN
+            UPDATE series_summary
+            SET file_count = file_count - 1,
+                total_size = total_size - COALESCE(OLD.size_bytes, 0)
+            WHERE series_name = OLD.series_name AND resolution = OLD.resolution;
+            DELETE FROM series_summary
+            WHERE series_name = OLD.series_name AND resolution = OLD.resolution AND file_count <= 0;
+            INSERT INTO series_summary (series_name, resolution, file_count, total_size)
+            VALUES (NEW.series_name, NEW.resolution, 1, COALESCE(NEW.size_bytes, 0))
+            ON CONFLICT(series_name, resolution) DO UPDATE SET
+                file_count = file_count + 1,
+                total_size = total_size + excluded.total_size;
+        END
+    """)
+    # Seed from existing rows; the triggers keep it current from here on
+    local_cursor.execute("DELETE FROM series_summary")
+    local_cursor.execute("""
+        INSERT INTO series_summary (series_name, resolution, file_count, total_size)
+        SELECT series_name, resolution, COUNT(*), COALESCE(SUM(size_bytes), 0)
+        FROM files
+        GROUP BY series_name, resolution
+    """)
+    local_conn.commit()
+
+def _migrate_to_v4(local_conn):
+    """Add the FTS5 series name index, kept in sync through series_summary"""
+    local_cursor = local_conn.cursor()
+    local_cursor.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS series_fts USING fts5(
+            series_name,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '1 2 3'
+        )
+    """)
+    # A series enters the index with its first summary row and leaves with its last
+    local_cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_fts_insert AFTER INSERT ON series_summary
+        WHEN NOT EXISTS (
+            SELECT 1 FROM series_summary
+            WHERE series_name = NEW.series_name AND resolution != NEW.resolution
+        )
+        BEGIN
+            INSERT INTO series_fts (series_name) VALUES (NEW.series_name);
+        END
+    """)
+    local_cursor.execute("""
+        CREATE TRIGGER IF NOT EXISTS trg_summary_fts_delete AFTER DELETE ON series_summary
+        WHEN NOT EXISTS (SELECT 1 FROM series_summary WHERE series_name = OLD.series_name)
+        BEGIN
+            DELETE FROM series_fts WHERE series_name = OLD.series_name;
+        END
+    """)
+    local_cursor.execute("DELETE FROM series_fts")
+    local_cursor.execute("INSERT INTO series_fts (series_name) SELECT DISTINCT series_name FROM series_summary")
+    local_conn.commit()
+
+def _create_rollup_tables(local_cursor):
+    """Create the download rollup tables and the rollup watermark row"""
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS download_daily_series (
+            day TEXT NOT NULL,
+            series_name TEXT NOT NULL,
+            downloads INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, series_name)
+        ) WITHOUT ROWID
+    """)
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS download_daily_users (
+            day TEXT NOT NULL,
+            user_id INTEGER NOT NULL,
+            downloads INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, user_id)
+        ) WITHOUT ROWID
+    """)
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS download_users (
+            user_id INTEGER PRIMARY KEY,
+            first_seen TIMESTAMP,
+            last_seen TIMESTAMP,
+            downloads INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS download_series_totals (
+            series_name TEXT PRIMARY KEY,
+            downloads INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+    # Single row: lifetime totals plus the last download_stats.id folded in
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS download_totals (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            downloads INTEGER NOT NULL DEFAULT 0,
+            users INTEGER NOT NULL DEFAULT 0,
+            rolled_up_to INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    local_cursor.execute("INSERT OR IGNORE INTO download_totals (id) VALUES (1)")
+    # Every (user, series, file) ever downloaded, so "new only" outlives raw row retention
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS download_received (
+            user_id INTEGER NOT NULL,
+            series_name TEXT NOT NULL,
+            file_id TEXT NOT NULL,
+            PRIMARY KEY (user_id, series_name, file_id)
+        ) WITHOUT ROWID
+    """)
+
+def _migrate_to_v5(local_conn):
+    """Add download_stats rollup tables and the rollup watermark"""
+    _create_rollup_tables(local_conn.cursor())
+    local_conn.commit()
+
+# download_stats and its rollups, moved to telemetry.db in v6
+TELEMETRY_TABLES = (
+    'download_stats', 'download_daily_series', 'download_daily_users',
+    'download_users', 'download_series_totals', 'download_totals',
+)
+
+def _migrate_to_v6(local_conn):
+    """Move download_stats and its rollups out of the catalog into telemetry.db"""
+    local_conn.commit()
+    local_conn.execute("ATTACH DATABASE ? AS telemetry", (str(TELEMETRY_DB_FILE),))
+    try:
+        existing = {row[0] for row in local_conn.execute("SELECT name FROM main.sqlite_master WHERE type = 'table'")}
+        for table in TELEMETRY_TABLES:
+            if table not in existing:
+                continue
+            # WAL makes this atomic per file only; INSERT OR REPLACE keeps a rerun after a crash idempotent
+            moved = local_conn.execute(f"INSERT OR REPLACE INTO telemetry.{table} SELECT * FROM main.{table}").rowcount
+            local_conn.execute(f"DROP TABLE main.{table}")
+            local_conn.commit()
+            logger.info(f"Moved {moved} rows of {table} to {TELEMETRY_DB_FILE.name}")
+    finally:
+        local_conn.execute("DETACH DATABASE telemetry")
+
+def _migrate_to_v7(local_conn):
+    """Add persistent delivery jobs and their per-episode items"""
+    local_cursor = local_conn.cursor()
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS delivery_jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            series_name TEXT NOT NULL,
+            resolution TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            total INTEGER NOT NULL DEFAULT 0,
+            progress_message_id INTEGER,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+    local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_delivery_job_status ON delivery_jobs(status)")
+    # Items snapshot the episode list when the job is created, in send order
+    local_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS delivery_items (
+            job_id INTEGER NOT NULL,
+            position INTEGER NOT NULL,
+            message_id INTEGER NOT NULL,
+            file_id TEXT NOT NULL,
+            season TEXT,
+            episode TEXT,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            PRIMARY KEY (job_id, position)
+        ) WITHOUT ROWID
+    """)
+    local_cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_delivery_item_status
+        ON delivery_items(job_id, status, position)
+    """)
+    local_conn.commit()
+
+def _migrate_to_v8(local_conn):
+    """Record each delivery item's media type so items can be sent as albums"""
+    local_cursor = local_conn.cursor()
+    existing = {row[1] for row in local_cursor.execute("PRAGMA table_info(delivery_items)")}
+    if 'file_type' not in existing:
+        local_cursor.execute("ALTER TABLE delivery_items ADD COLUMN file_type TEXT")
+    local_conn.commit()
+
+def _migrate_to_v9(local_conn):
+    """Record which episodes (all, a season, a range or the latest N) a delivery job covers"""
+    local_cursor = local_conn.cursor()
+    existing = {row[1] for row in local_cursor.execute("PRAGMA table_info(delivery_jobs)")}
+    if 'scope' not in existing:
+        local_cursor.execute("ALTER TABLE delivery_jobs ADD COLUMN scope TEXT NOT NULL DEFAULT 'all'")
+    local_conn.commit()
+
+def _migrate_to_v10(local_conn):
+    """Index delivery jobs by user and series for the "new only" history lookup"""
+    local_cursor = local_conn.cursor()
+    local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_delivery_job_user ON delivery_jobs(user_id, series_name)")
+    local_conn.commit()
+
+def _migrate_to_v11(local_conn):
+    """Rebuild idx_episode_order so episodes without a season or number sort last, as they did before v2"""
+    local_cursor = local_conn.cursor()
+    # SQLite sorts NULLs first; the IS NULL terms let the index serve NULLS LAST ordering
+    local_cursor.execute("DROP INDEX IF EXISTS idx_episode_order")
+    local_cursor.execute("""
+        CREATE INDEX idx_episode_order
+        ON files(series_name, resolution, season_num IS NULL, season_num, episode_num IS NULL, episode_num)
+    """)
+    local_conn.commit()
+
+def _migrate_to_v12(local_conn):
+    """Index delivery items by message id so the "new only" lookup probes each job's items directly"""
+    local_cursor = local_conn.cursor()
+    local_cursor.execute("""
+        CREATE INDEX IF NOT EXISTS idx_delivery_item_message
+        ON delivery_items(job_id, message_id, status)
+    """)
+    local_conn.commit()
+
+def _migrate_to_v13(local_conn):
+    """Backfill download_received from the raw download_stats rows retention hasn't pruned yet"""
+    telemetry_conn = get_connection(TELEMETRY)
+    _create_rollup_tables(telemetry_conn.cursor())
+    telemetry_conn.execute("""
+        INSERT OR IGNORE INTO download_received (user_id, series_name, file_id)
+        SELECT DISTINCT user_id, series_name, file_id FROM download_stats
+    """)
+    telemetry_conn.commit()
+
+def _migrate_to_v14(local_conn):
+    """Index series mappings by age so the newest can be preloaded without a sort"""
+    local_cursor = local_conn.cursor()
+    local_cursor.execute("CREATE INDEX IF NOT EXISTS idx_mapping_created ON series_mapping(created_at)")
+    local_conn.commit()
+
+# Migration steps keyed by the version they upgrade to
+MIGRATIONS = {
+    2: _migrate_to_v2,
+    3: _migrate_to_v3,
+    4: _migrate_to_v4,
+    5: _migrate_to_v5,
+    6: _migrate_to_v6,
+    7: _migrate_to_v7,
+    8: _migrate_to_v8,
+    9: _migrate_to_v9,
+    10: _migrate_to_v10,
+    11: _migrate_to_v11,
+    12: _migrate_to_v12,
+    13: _migrate_to_v13,
+    14: _migrate_to_v14,
+}
+
 # Perform schema migrations
-CURRENT_SCHEMA_VERSION = 1
+CURRENT_SCHEMA_VERSION = 14
 try:
+    # Initialize databases on import (telemetry first: the v6 migration moves rows into it)
+    initialize_telemetry()
+    initialize_database()
+
     current_version = get_schema_version()
 
-    if current_version < CURRENT_SCHEMA_VERSION:
-        logger.info(f"Migrating database from version {current_version} to {CURRENT_SCHEMA_VERSION}")
-        # Add future migration steps here when needed
-        set_schema_version(CURRENT_SCHEMA_VERSION)
+    while current_version < CURRENT_SCHEMA_VERSION:
+        next_version = current_version + 1
+        logger.info(f"Migrating database from version {current_version} to {next_version}")
+        MIGRATIONS[next_version](get_connection())
+        set_schema_version(next_version)
+        current_version = next_version
+
+    # Import-time setup is done; runtime access goes through the writer thread and reader pool
+    close_connections()
 
-    # Initialize database on import
-    initialize_database()
-    
 except Exception as e:
     logger.error(f"Database setup failed: {e}")
     raise
\ No newline at end of file
@@ -0,0 +1,688 @@
+import asyncio
+import json
+import logging
+import re
+from typing import NamedTuple, Optional
+from pyrogram import enums
+from pyrogram.types import InputMediaDocument, InputMediaVideo, InputMediaAudio
+from pyrogram.errors import (
+    UserIsBlocked, PeerIdInvalid, FileReferenceExpired, FileReferenceInvalid, FileIdInvalid, MediaEmpty
+)
+from shared import (
+    app, DATABASE_CHANNEL, DELIVERY_WORKERS, DELIVERY_MAX_ATTEMPTS, DELIVERY_JOB_RETENTION_DAYS,
+    DELIVERY_MODE, DELIVERY_MAX_PER_USER, DELIVERY_ADMIN_WEIGHT, ADMINS
+)
+from database import transaction, fetch_one, fetch_all, execute
+from rate_limiter import send_scheduler
+from fair_queue import FairQueue
+from delivery_pool import DeliveryBot, DeliveryPool, delivery_pool
+from utils import log_download
+
+logger = logging.getLogger(__name__)
+
+# Progress message is refreshed after this many sends
+PROGRESS_EVERY = 5
+
+# Telegram's media group size limit
+ALBUM_SIZE = 10
+
+# Errors meaning a cached file_id can no longer be sent; copying the channel message still works
+FILE_REFERENCE_ERRORS = (FileReferenceExpired, FileReferenceInvalid, FileIdInvalid, MediaEmpty)
+
+# Client method that sends each stored file_type by file_id
+SENDERS = {
+    'document': 'send_document',
+    'video': 'send_video',
+    'audio': 'send_audio',
+    'animation': 'send_animation',
+}
+
+# Media types that can share an album; a group must be all one type
+ALBUM_MEDIA = {
+    'document': InputMediaDocument,
+    'video': InputMediaVideo,
+    'audio': InputMediaAudio,
+}
+
+# Episode range codes as carried in callback data and delivery_jobs.scope;
+# a trailing '+' means only episodes the user hasn't received yet
+_RANGE_CODE = re.compile(r"(?:all|S(\d+)(?:E(\d+)-(\d+))?|L(\d+))(\+)?")
+
+class EpisodeRange(NamedTuple):
+    """Which episodes of a resolution a delivery covers; every episode when all fields are unset"""
+    season: Optional[int] = None
+    first: Optional[int] = None
+    last: Optional[int] = None
+    latest: Optional[int] = None
+    missing: bool = False
+
+    @classmethod
+    def parse(cls, code):
+        """Range from a code like 'all', 'S2', 'S2E5-10', 'L5' or 'all+'; None if malformed"""
+        match = _RANGE_CODE.fullmatch(code or '')
+        if not match:
+            return None
+        *numbers, missing = match.groups()
+        season, first, last, latest = (int(group) if group else None for group in numbers)
+        if first is not None and first > last:
+            first, last = last, first
+        return cls(season, first, last, latest, bool(missing))
+
+    @property
+    def code(self):
+        if self.latest:
+            code = f"L{self.latest}"
+        elif self.season is None:
+            code = "all"
+        elif self.first is None:
+            code = f"S{self.season}"
+        else:
+            code = f"S{self.season}E{self.first}-{self.last}"
+        return code + "+" if self.missing else code
+
+    @property
+    def label(self):
+        if self.latest:
+            label = f"latest {self.latest}"
+        elif self.season is None:
+            label = "all episodes"
+        elif self.first is None:
+            label = f"S{self.season:02d}"
+        else:
+            label = f"S{self.season:02d}E{self.first:02d}–E{self.last:02d}"
+        return label + ", new only" if self.missing else label
+
+class DeliveryJob(NamedTuple):
+    """A persisted bulk send of a resolution of a series (or a range of it) to one user"""
+    id: int
+    user_id: int
+    series_name: str
+    resolution: str
+    status: str
+    total: int
+    progress_message_id: Optional[int]
+    scope: str
+
+    @property
+    def title(self):
+        """'Series (720p)', or 'Series S02 (720p)' for a partial delivery"""
+        episodes = EpisodeRange.parse(self.scope) or EpisodeRange()
+        if episodes == EpisodeRange():
+            return f"{self.series_name} ({self.resolution})"
+        return f"{self.series_name} {episodes.label} ({self.resolution})"
+
+class DeliveryItem(NamedTuple):
+    """One pending episode of a delivery job"""
+    position: int
+    message_id: int
+    file_id: str
+    season: str
+    episode: str
+    file_type: Optional[str]
+    attempts: int
+
+def album_batches(items, album_size=ALBUM_SIZE):
+    """Split items into consecutive runs of one album-capable type (at most album_size each).
+
+    Items that can't share an album come out as single-item batches, so send
+    order is preserved either way.
+    """
+    batch = []
+    for item in items:
+        if batch and (item.file_type != batch[0].file_type or len(batch) >= album_size):
+            yield batch
+            batch = []
+        if item.file_type not in ALBUM_MEDIA:
+            yield [item]
+            continue
+        batch.append(item)
+    if batch:
+        yield batch
+
+def _create_job(tx, user_id, series_name, resolution, episodes, unsent=None):
+    tx.execute('delivery.create_job', (user_id, series_name, resolution, episodes.code))
+    job_id = tx.cursor.lastrowid
+    if episodes.latest:
+        total = tx.execute('delivery.create_items_latest', (job_id, series_name, resolution, episodes.latest))
+    elif episodes.first is not None:
+        total = tx.execute(
+            'delivery.create_items_range',
+            (job_id, series_name, resolution, episodes.season, episodes.season, episodes.first, episodes.last)
+        )
+    elif episodes.season is not None:
+        total = tx.execute(
+            'delivery.create_items_season', (job_id, series_name, resolution, episodes.season, episodes.season)
+        )
+    else:
+        total = tx.execute('delivery.create_items', (job_id, series_name, resolution))
+    if unsent is not None:
+        # Positions keep their gaps; they only order the sends
+        total -= tx.execute('delivery.drop_received_items', (job_id, json.dumps(unsent)))
+    # Another range already on its way must not send its episodes twice
+    total -= tx.execute('delivery.drop_queued_items', (job_id, user_id, series_name, resolution, job_id))
+    if not total:
+        tx.execute('delivery.delete_job', (job_id,))
+        return None
+    tx.execute('delivery.set_total', (total, job_id))
+    return job_id
+
+async def unsent_message_ids(user_id, series_name, resolution):
+    """Channel message ids of a resolution's episodes the user hasn't received.
+
+    Anti-joins the episode list against the user's download history and
+    against items sent by their recent delivery jobs or still pending in
+    their unfinished ones, so "new only" never queues an episode twice.
+    The history is the download_received rollup, which retention never
+    prunes, plus the raw rows not folded into it yet (read through the
+    telemetry ATTACH on catalog readers). The job items match by message
+    id, so they still count an episode whose file_id was refreshed or
+    whose download row isn't flushed yet.
+    """
+    rows = await fetch_all('delivery.unsent_files', (series_name, resolution, user_id, user_id, user_id))
+    return [message_id for message_id, in rows]
+
+async def create_job(user_id, series_name, resolution, episodes=EpisodeRange()):
+    """Persist a job with one pending item per episode in range; None if there are no episodes"""
+    unsent = await unsent_message_ids(user_id, series_name, resolution) if episodes.missing else None
+    return await transaction(lambda tx: _create_job(tx, user_id, series_name, resolution, episodes, unsent))
+
+async def get_job(job_id):
+    row = await fetch_one('delivery.job', (job_id,))
+    return DeliveryJob(*row) if row else None
+
+def _file_id(item, bot):
+    """The file_id `bot` can send an item by: the stored one for the primary, else the bot's own"""
+    return item.file_id if bot.primary else bot.file_id(item.message_id)
+
+def episode_caption(client, job, season, episode):
+    """Caption for a delivered episode"""
+    caption = f"**{job.series_name}** "
+    if season and episode:
+        caption += f"{season}{episode} "
+    elif season:
+        caption += f"{season} "
+    elif episode:
+        caption += f"{episode} "
+    caption += f"{job.resolution}\n"
+    caption += f"via @{client.me.username}"
+    return caption
+
+class ActiveJob:
+    """Send state of a job that has batches on the fair queue"""
+
+    def __init__(self, client, job, key):
+        self.client = client
+        self.job = job
+        self.key = key
+        # Batches queued or being sent; when it reaches 0 the job is re-read from its items
+        self.outstanding = 0
+        self.sent_since_update = 0
+        self.announced = False
+        self.error = None
+
+class DeliveryManager:
+    """Runs delivery jobs from their persisted state on background workers.
+
+    Handlers only create and submit a job, so long sends never hold one of
+    pyrogram's update workers. A job's pending items are queued as batches
+    (one API call each) on its user's flow of a FairQueue, and `workers`
+    tasks take batches in weighted fair order across users: a small request
+    is interleaved with long ones instead of waiting behind them, and admins
+    get `admin_weight` times a user's share. Batches go out through the
+    pool bot the user is sharded to (`workers` tasks per bot), failing over
+    to other bots and finally the primary. Every send is recorded on its
+    item row as it happens, so a job interrupted by a restart resumes from
+    its first pending item. Items are delivered at least once: one in
+    flight during a crash may be sent again.
+    """
+
+    def __init__(self, workers=DELIVERY_WORKERS, max_attempts=DELIVERY_MAX_ATTEMPTS,
+                 max_per_user=DELIVERY_MAX_PER_USER, admin_weight=DELIVERY_ADMIN_WEIGHT, pool=None):
+        self.workers = max(1, workers)
+        # Bots that send the episodes; None means the client passed to start() alone
+        self.pool = pool
+        self.max_attempts = max_attempts
+        self.max_per_user = max(1, max_per_user)
+        self.admin_weight = max(1, admin_weight)
+        self._fair_queue = None
+        self._worker_tasks = []
+        # Active jobs: job id -> ActiveJob, and (user, series, resolution, range code) -> job id,
+        # so a job is never scheduled twice and repeat requests join it
+        self._jobs = {}
+        self._inflight = {}
+        self.sending = 0
+        self.completed = 0
+        self.coalesced = 0
+
+    async def start(self, client=app):
+        """Start the workers and resume every job that was pending or running when the bot stopped"""
+        if self._worker_tasks:
+            return
+        if self.pool is None:
+            self.pool = DeliveryPool([DeliveryBot("primary", client, send_scheduler, primary=True)])
+        await self.pool.start()
+        self._fair_queue = FairQueue()
+        # `workers` concurrent sends per bot
+        self._worker_tasks = [
+            asyncio.create_task(self._worker()) for _ in range(self.workers * len(self.pool.bots))
+        ]
+        rows = await fetch_all('delivery.unfinished_jobs')
+        for job_id, user_id, series_name, resolution, scope in rows:
+            try:
+                await self.submit(client, job_id, (user_id, series_name, resolution, scope))
+            except Exception as e:
+                logger.error(f"Error resuming delivery job {job_id}: {e}")
+        logger.info(
+            f"Delivery workers started ({len(self._worker_tasks)} workers, {len(self.pool.bots)} bots, "
+            f"{len(rows)} jobs resumed)"
+        )
+
+    async def stop(self):
+        """Cancel the workers; running jobs stay unfinished and resume on the next start"""
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+        self._fair_queue = None
+        self._jobs.clear()
+        self._inflight.clear()
+        if self.pool:
+            await self.pool.stop()
+
+    async def submit(self, client, job_id, key):
+        """Queue a job's pending items for the workers; False if it is already active"""
+        if job_id in self._jobs:
+            return False
+        job = await get_job(job_id)
+        if job is None:
+            return False
+        active = self._jobs[job_id] = ActiveJob(client, job, key)
+        self._inflight[key] = job_id
+        await execute('delivery.set_status', ('running', job.id))
+        if not await self._schedule(active):
+            await self._complete(active)
+        return True
+
+    def _running_job(self, user_id, series_name, resolution):
+        """Id of an active job sending some range of the resolution to the user, if any"""
+        return next(
+            (job_id for key, job_id in self._inflight.items() if key[:3] == (user_id, series_name, resolution) and job_id),
+            None
+        )
+
+    def in_flight(self, user_id):
+        """Deliveries queued or running for a user"""
+        return sum(1 for key in self._inflight if key[0] == user_id)
+
+    async def request(self, client, user_id, series_name, resolution, episodes=EpisodeRange()):
+        """Start delivering a resolution (or a range of it) to a user, or join it if it is already in flight.
+
+        Returns (status, job_id): 'queued' for a new job, 'in_progress' when
+        the same delivery is already queued or running (or every episode in
+        range already is, as part of another), 'busy' when the user is at
+        the per-user cap and 'empty' when there is nothing to send. A new
+        range of a resolution that is already being sent only gets the
+        episodes not queued yet.
+        """
+        key = (user_id, series_name, resolution, episodes.code)
+        if key in self._inflight:
+            self.coalesced += 1
+            return 'in_progress', self._inflight[key]
+        if self.in_flight(user_id) >= self.max_per_user:
+            return 'busy', None
+
+        # Claim the key before awaiting so a double tap can't create a second job
+        self._inflight[key] = None
+        try:
+            job_id = await create_job(user_id, series_name, resolution, episodes)
+            if job_id is None:
+                running = self._running_job(user_id, series_name, resolution)
+                if running:
+                    self.coalesced += 1
+                    return 'in_progress', running
+                return 'empty', None
+            # The progress message is posted by the worker, so the handler only touches the database
+            await self.submit(client, job_id, key)
+            return 'queued', job_id
+        finally:
+            if self._inflight.get(key) is None:
+                self._inflight.pop(key, None)
+
+    async def progress_text(self, job_id):
+        """Current progress of a job, as shown in its progress message"""
+        job = await get_job(job_id)
+        return await self._progress_text(job) if job else None
+
+    def queue_status(self, user_id):
+        """(position, users, eta): the user's place in the send order, how many users
+        are queued and rough seconds until their queued batches are sent.
+
+        Position is 0 while one of the user's batches is being sent and None
+        when nothing of theirs is queued.
+        """
+        if not self._fair_queue:
+            return None, 0, send_scheduler.estimate(user_id, 0)
+        backlog = self._fair_queue.backlog(user_id)
+        # The user's shard bot sets the per-chat pace; every healthy bot adds to the shared rate
+        eta = max(
+            self.pool.route(user_id)[0].scheduler.estimate(user_id, backlog),
+            self._fair_queue.finish_time(user_id, self.pool.rate())
+        )
+        return self._fair_queue.position(user_id), self._fair_queue.flows, eta
+
+    @property
+    def running(self):
+        return len(self._jobs)
+
+    @property
+    def queued(self):
+        return len(self._fair_queue) if self._fair_queue else 0
+
+    def _weight(self, user_id):
+        return self.admin_weight if user_id in ADMINS else 1
+
+    async def _schedule(self, active):
+        """Queue the job's pending items on its user's flow, one entry per send; False if none are left"""
+        rows = await fetch_all('delivery.pending_items', (active.job.id,))
+        items = [DeliveryItem(*row) for row in rows]
+        batches = list(album_batches(items)) if DELIVERY_MODE == "album" else [[item] for item in items]
+        user_id = active.job.user_id
+        for batch in batches:
+            self._fair_queue.push(user_id, (active, batch), weight=self._weight(user_id))
+        active.outstanding = len(batches)
+        return bool(batches)
+
+    async def _worker(self):
+        while True:
+            user_id, (active, batch) = await self._fair_queue.get()
+            self.sending += 1
+            try:
+                if not active.announced:
+                    await self._announce(active)
+                active.sent_since_update += await self._deliver(active, batch)
+            except Exception as e:
+                if not isinstance(e, (UserIsBlocked, PeerIdInvalid)):
+                    logger.error(f"Error in delivery job {active.job.id}: {e}")
+                # Give up on the job: its other batches are dropped and it finishes with the error
+                active.error = e
+                active.outstanding -= self._fair_queue.remove(user_id, lambda entry: entry[0] is active)
+            finally:
+                self.sending -= 1
+                self._fair_queue.release(user_id)
+            active.outstanding -= 1
+            try:
+                await self._advance(active)
+            except Exception as e:
+                logger.error(f"Error advancing delivery job {active.job.id}: {e}")
+
+    async def _advance(self, active):
+        """Refresh progress after a send; once no batches are left, retry leftovers or finish"""
+        if active.outstanding > 0:
+            if active.sent_since_update >= PROGRESS_EVERY:
+                active.sent_since_update = 0
+                await self._update_progress(active)
+            return
+        # Items whose attempts failed are still pending and go round again
+        if active.error is None and await self._schedule(active):
+            return
+        await self._complete(active)
+
+    async def _complete(self, active):
+        job = active.job
+        try:
+            if isinstance(active.error, (UserIsBlocked, PeerIdInvalid)):
+                await execute('delivery.set_status', ('failed', job.id))
+                message = "Please start a chat with the bot first."
+            elif active.error is not None:
+                # Failed rather than left running: a restart must not resend what was already delivered
+                await execute('delivery.set_status', ('failed', job.id))
+                message = f"Error: {str(active.error)}"
+                await self._report_error(active)
+            else:
+                _, message = await self._finish(active.client, job)
+            logger.info(f"Delivery job {job.id} finished: {message}")
+        except Exception as e:
+            logger.error(f"Delivery job {job.id} crashed: {e}")
+        finally:
+            self.completed += 1
+            self._jobs.pop(job.id, None)
+            if self._inflight.get(active.key) == job.id:
+                del self._inflight[active.key]
+
+    async def _report_error(self, active):
+        """Replace the progress message with what was sent before the job stopped"""
+        job = active.job
+        try:
+            sent, _, total = await fetch_one('delivery.counts', (job.id,))
+            await self._progress(
+                active.client, job,
+                f"**Download Failed**\n\n"
+                f"Sent {sent}/{total} episodes of {job.title} before an error: {active.error}\n\n"
+                f"Choose \"Missing only\" for this resolution to get the rest."
+            )
+        except Exception as e:
+            logger.warning(f"Could not report the error of job {job.id}: {e}")
+
+    async def _announce(self, active):
+        """Post the progress message (or refresh a resumed job's) before the job's first send"""
+        active.announced = True
+        try:
+            active.job = await self._progress(active.client, active.job, await self._progress_text(active.job))
+        except (UserIsBlocked, PeerIdInvalid):
+            raise
+        except Exception as e:
+            logger.warning(f"Could not post progress message for job {active.job.id}: {e}")
+
+    async def _update_progress(self, active):
+        try:
+            active.job = await self._progress(active.client, active.job, await self._progress_text(active.job))
+        except Exception as e:
+            logger.warning(f"Could not update progress message for job {active.job.id}: {e}")
+
+    async def _progress(self, client, job, text):
+        """Edit the job's progress message, sending (and remembering) it the first time"""
+        if job.progress_message_id:
+            await send_scheduler.send(
+                job.user_id, client.edit_message_text, job.user_id, job.progress_message_id, text
+            )
+            return job
+        message = await send_scheduler.send(job.user_id, client.send_message, job.user_id, text)
+        await execute('delivery.set_progress_message', (message.id, job.id))
+        return job._replace(progress_message_id=message.id)
+
+    async def _progress_text(self, job):
+        sent, failed, total = await fetch_one('delivery.counts', (job.id,))
+        position, users, remaining = self.queue_status(job.user_id)
+        text = (
+            f"**Sending {total} episodes of {job.title}...**\n\n"
+            f"Progress: {sent}/{total} episodes sent\n"
+            f"Errors: {failed}\n"
+        )
+        if position:
+            text += f"Queue position: {position} of {users}\n"
+        return text + f"Remaining: ~{remaining:.0f} seconds"
+
+    async def _copy_item(self, client, job, item, bot):
+        # Copy message from database channel to remove "Forwarded from" badge
+        return await bot.scheduler.send(
+            job.user_id,
+            bot.client.copy_message,
+            chat_id=job.user_id,
+            from_chat_id=DATABASE_CHANNEL,
+            message_id=item.message_id,
+            caption=episode_caption(client, job, item.season, item.episode),
+            parse_mode=enums.ParseMode.MARKDOWN
+        )
+
+    async def _send_item(self, client, job, item, bot):
+        """Send by cached file_id with the type's sender; copy from the channel if that fails.
+
+        Stored file_ids belong to the primary bot; a worker bot uses the one
+        it got from its own first copy, so it copies until it has one.
+        Returns the item as sent, with the catalog's refreshed file_id if
+        the copy replaced a stale one.
+        """
+        sender = SENDERS.get(item.file_type)
+        if not sender:
+            await self._copy_item(client, job, item, bot)
+            return item
+        file_id = _file_id(item, bot)
+        if file_id:
+            try:
+                await bot.scheduler.send(
+                    job.user_id,
+                    getattr(bot.client, sender),
+                    job.user_id,
+                    file_id,
+                    caption=episode_caption(client, job, item.season, item.episode),
+                    parse_mode=enums.ParseMode.MARKDOWN
+                )
+                return item
+            except FILE_REFERENCE_ERRORS as e:
+                logger.info(f"Cached file_id for message {item.message_id} rejected ({e}), copying instead")
+        message = await self._copy_item(client, job, item, bot)
+        return item._replace(file_id=await self._refresh_file_id(item, message, bot))
+
+    async def _refresh_file_id(self, item, message, bot):
+        """Store the file_id Telegram returned with a fresh copy; returns the catalog's file_id for the item"""
+        media = getattr(message, item.file_type, None)
+        if media is None:
+            return item.file_id
+        if not bot.primary:
+            # A worker's file_id is only good for that bot; the catalog keeps the primary's
+            bot.remember_file_id(item.message_id, media.file_id)
+            return item.file_id
+        if media.file_id == item.file_id:
+            return item.file_id
+        try:
+            await execute('files.update_file_id', (media.file_id, item.message_id, item.file_id))
+        except Exception as e:
+            logger.error(f"Error refreshing file_id for message {item.message_id}: {e}")
+        return media.file_id
+
+    async def _send_album(self, client, job, items, bot):
+        # One API call and one rate-limit token for up to ALBUM_SIZE episodes
+        media_type = ALBUM_MEDIA[items[0].file_type]
+        return await bot.scheduler.send(
+            job.user_id,
+            bot.client.send_media_group,
+            job.user_id,
+            [
+                media_type(
+                    _file_id(item, bot),
+                    caption=episode_caption(client, job, item.season, item.episode),
+                    parse_mode=enums.ParseMode.MARKDOWN
+                )
+                for item in items
+            ]
+        )
+
+    async def _mark_sent(self, job, items):
+        await transaction(
+            lambda tx: tx.executemany('delivery.item_sent', [(item.file_id, job.id, item.position) for item in items])
+        )
+        for item in items:
+            log_download(job.user_id, job.series_name, item.file_id)
+
+    async def _deliver_single(self, client, job, item, bot):
+        """Send one item and record the outcome; True if it was sent.
+
+        Only the primary records failed attempts; a worker bot's error is
+        raised so the batch fails over to the next bot.
+        """
+        try:
+            item = await self._send_item(client, job, item, bot)
+        except (UserIsBlocked, PeerIdInvalid):
+            raise
+        except Exception as e:
+            if not bot.primary:
+                raise
+            logger.error(f"Error sending item {item.position} of job {job.id} (attempt {item.attempts + 1}): {e}")
+            await execute(
+                'delivery.item_attempt_failed', (str(e), self.max_attempts, job.id, item.position)
+            )
+            await asyncio.sleep(2)
+            return False
+        await self._mark_sent(job, [item])
+        return True
+
+    async def _deliver_batch(self, client, job, items, bot):
+        """Send a batch as an album when possible, else item by item; returns the number sent.
+
+        Sent items are removed from `items`, so after an error it holds
+        only what is left for the next bot.
+        """
+        if len(items) > 1 and DELIVERY_MODE == "album" and all(_file_id(item, bot) for item in items):
+            try:
+                await self._send_album(client, job, items, bot)
+            except (UserIsBlocked, PeerIdInvalid):
+                raise
+            except Exception as e:
+                # e.g. a stale file_id: copying from the channel still works
+                logger.warning(f"Album of {len(items)} items failed for job {job.id}, sending singly: {e}")
+            else:
+                await self._mark_sent(job, items)
+                sent = len(items)
+                items.clear()
+                return sent
+
+        sent = 0
+        while items:
+            if await self._deliver_single(client, job, items[0], bot):
+                sent += 1
+            items.pop(0)
+        return sent
+
+    async def _deliver(self, active, batch):
+        """Send a batch through the user's shard bot, failing over along the pool's route"""
+        user_id = active.job.user_id
+        items = list(batch)
+        sent = 0
+        for bot in self.pool.route(user_id):
+            try:
+                sent += await self._deliver_batch(active.client, active.job, items, bot)
+                bot.record_success()
+                return sent
+            except (UserIsBlocked, PeerIdInvalid):
+                if bot.primary:
+                    raise
+                # The user never started (or blocked) this worker bot
+                bot.mark_unreachable(user_id)
+            except Exception as e:
+                if bot.primary:
+                    raise
+                bot.record_failure(e)
+                logger.warning(f"Delivery bot {bot.name} failed for job {active.job.id}, failing over: {e}")
+            bot.failovers += 1
+        return sent
+
+    async def _finish(self, client, job):
+        sent, failed, total = await fetch_one('delivery.counts', (job.id,))
+        await execute('delivery.set_status', ('done' if sent else 'failed', job.id))
+
+        if not sent:
+            await self._progress(client, job, "Failed to send any episodes. Please try again.")
+            return False, "All episodes failed to send"
+
+        success_message = "**Forwarded!**\n"
+        if failed:
+            success_message += "Some episodes failed to send. Choose \"Missing only\" for this resolution to get just the ones you don't have.\n\n"
+        success_message += "Enjoy your episodes!"
+        try:
+            await self._progress(client, job, success_message)
+        except Exception:
+            await send_scheduler.send(job.user_id, client.send_message, job.user_id, success_message)
+        return True, f"Sent {sent}/{total} episodes"
+
+async def cleanup_delivery_jobs(retention_days=DELIVERY_JOB_RETENTION_DAYS):
+    """Delete finished jobs (and their items) older than the retention window"""
+    age = f"-{int(retention_days)} days"
+
+    def _prune(tx):
+        tx.execute('delivery.prune_items', (age,))
+        return tx.execute('delivery.prune_jobs', (age,))
+
+    return await transaction(_prune)
+
+# Process-wide delivery manager
+delivery_manager = DeliveryManager(pool=delivery_pool)
@@ -0,0 +1,167 @@
+import logging
+import time
+from collections import OrderedDict
+from pyrogram.client import Client
+from shared import app, API_ID, API_HASH, DELIVERY_BOT_TOKENS
+from rate_limiter import SendScheduler, send_scheduler
+
+logger = logging.getLogger(__name__)
+
+class DeliveryBot:
+    """One token that can send deliveries, with its own send budget and health.
+
+    Consecutive failures take the bot out of rotation for a cooldown that
+    doubles with each further failure. Users it can't message (they never
+    started this bot, or blocked it) are remembered for `unreachable_ttl`
+    seconds so their sends go straight to another bot. file_ids are per
+    bot, so a worker keeps the ones it gets back from copying channel
+    messages and sends those episodes by file_id (and as albums) after.
+    """
+
+    def __init__(self, name, client, scheduler, primary=False, failure_threshold=3,
+                 base_cooldown=30, max_cooldown=600, unreachable_ttl=86400, max_unreachable=10000,
+                 max_file_ids=10000):
+        self.name = name
+        self.client = client
+        self.scheduler = scheduler
+        self.primary = primary
+        self.failure_threshold = failure_threshold
+        self.base_cooldown = base_cooldown
+        self.max_cooldown = max_cooldown
+        self.unreachable_ttl = unreachable_ttl
+        self.max_unreachable = max_unreachable
+        self.max_file_ids = max_file_ids
+        self.enabled = True
+        self.failures = 0
+        self.down_until = 0.0
+        self._unreachable = OrderedDict()
+        # Channel message id -> this bot's file_id for its media, least recently used first
+        self._file_ids = OrderedDict()
+        # Observability counters
+        self.batches = 0
+        self.errors = 0
+        self.failovers = 0
+
+    def healthy(self, now=None):
+        return self.enabled and (now or time.monotonic()) >= self.down_until
+
+    def record_success(self):
+        self.batches += 1
+        self.failures = 0
+
+    def record_failure(self, error):
+        self.errors += 1
+        self.failures += 1
+        if self.failures >= self.failure_threshold:
+            cooldown = min(self.max_cooldown, self.base_cooldown * 2 ** (self.failures - self.failure_threshold))
+            self.down_until = time.monotonic() + cooldown
+            logger.warning(f"Delivery bot {self.name} failing ({error}), out of rotation for {cooldown}s")
+
+    def can_reach(self, user_id, now=None):
+        marked = self._unreachable.get(user_id)
+        if marked is None:
+            return True
+        if (now or time.monotonic()) - marked > self.unreachable_ttl:
+            del self._unreachable[user_id]
+            return True
+        return False
+
+    def mark_unreachable(self, user_id):
+        self._unreachable[user_id] = time.monotonic()
+        self._unreachable.move_to_end(user_id)
+        while len(self._unreachable) > self.max_unreachable:
+            self._unreachable.popitem(last=False)
+
+    def file_id(self, message_id):
+        """This bot's file_id for a channel message, if it has copied it before"""
+        file_id = self._file_ids.get(message_id)
+        if file_id is not None:
+            self._file_ids.move_to_end(message_id)
+        return file_id
+
+    def remember_file_id(self, message_id, file_id):
+        self._file_ids[message_id] = file_id
+        self._file_ids.move_to_end(message_id)
+        while len(self._file_ids) > self.max_file_ids:
+            self._file_ids.popitem(last=False)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'name': self.name,
+            'healthy': self.healthy(now),
+            'batches': self.batches,
+            'errors': self.errors,
+            'failovers': self.failovers,
+            'down_for': max(0.0, self.down_until - now) if self.enabled else None,
+            'unreachable': len(self._unreachable),
+            'file_ids': len(self._file_ids),
+            'sends': self.scheduler.sends,
+            'flood_waits': self.scheduler.flood_waits,
+        }
+
+class DeliveryPool:
+    """The primary bot plus optional delivery-only bots, with recipients sharded across them.
+
+    A user always maps to the same bot while it is healthy, so that bot's
+    per-chat budget, FloodWaits and cached file_ids stay meaningful. When
+    the shard's bot is down or can't reach the user, the next bot in the
+    ring takes over, and the primary is always the last resort. Worker
+    bots only send; updates are still handled by the primary alone.
+    """
+
+    def __init__(self, bots):
+        self.bots = list(bots)
+        self.primary = next(bot for bot in self.bots if bot.primary)
+
+    async def start(self):
+        """Connect the worker bots; one that fails to start is left out of rotation"""
+        for bot in self.bots:
+            if bot.primary:
+                continue
+            try:
+                await bot.client.start()
+                logger.info(f"Delivery bot {bot.name} started")
+            except Exception as e:
+                bot.enabled = False
+                logger.error(f"Delivery bot {bot.name} failed to start: {e}")
+
+    async def stop(self):
+        for bot in self.bots:
+            if bot.primary or not bot.enabled:
+                continue
+            try:
+                await bot.client.stop()
+            except Exception as e:
+                logger.error(f"Error stopping delivery bot {bot.name}: {e}")
+
+    def route(self, user_id):
+        """Bots to try for a user, in order: its shard, the rest of the ring, the primary last"""
+        start = user_id % len(self.bots)
+        ring = self.bots[start:] + self.bots[:start]
+        if ring[0].primary:
+            return [self.primary]
+        now = time.monotonic()
+        workers = [bot for bot in ring if not bot.primary and bot.healthy(now) and bot.can_reach(user_id, now)]
+        return workers + [self.primary]
+
+    def rate(self):
+        """Messages/second the healthy bots can send together"""
+        return sum(bot.scheduler.global_bucket.rate for bot in self.bots if bot.primary or bot.healthy())
+
+    def stats(self):
+        return [bot.stats() for bot in self.bots]
+
+def _build_pool():
+    bots = [DeliveryBot("primary", app, send_scheduler, primary=True)]
+    for index, token in enumerate(DELIVERY_BOT_TOKENS, start=1):
+        # Own session file and budget per token; no_updates keeps it a send-only client
+        client = Client(
+            f"tv_series_bot_delivery_{index}",
+            api_id=API_ID, api_hash=API_HASH, bot_token=token, no_updates=True
+        )
+        bots.append(DeliveryBot(f"worker{index}", client, SendScheduler()))
+    return DeliveryPool(bots)
+
+# Process-wide pool of bots used for deliveries
+delivery_pool = _build_pool()
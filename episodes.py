@@ -1,32 +1,31 @@
 from pyrogram import filters, enums
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from pyrogram.errors import UserIsBlocked, PeerIdInvalid, FloodWait, MessageNotModified
-from shared import app, ADMINS, DATABASE_CHANNEL, SPONSOR_CHANNEL
-from utils import decode_series_name, log_download
-from database import cursor
-import logging
+from pyrogram.errors import UserIsBlocked, PeerIdInvalid, MessageNotModified
+from shared import app, ADMINS, SPONSOR_CHANNEL, BROWSE_PAGE_SIZE
+from utils import decode_series_name
+from delivery import delivery_manager, EpisodeRange, ALBUM_SIZE
+from catalog import catalog, resolution_sort_key, seasons, season_episodes
+from pager import paginate, nav_row
+from rate_limiter import send_scheduler
 import asyncio
+import logging
 import time
 
 logger = logging.getLogger(__name__)
 
-async def show_resolutions(client, callback_query, encoded_name, series_name):
-    """Show available resolutions for a series"""
+# Episodes per range button on a season screen (one album's worth)
+EPISODE_RANGE_SIZE = ALBUM_SIZE
+
+# "Latest N" shortcuts on the episode picker
+LATEST_CHOICES = (1, 5, 10)
+
+# Acknowledgement edits still waiting on a chat's send budget; held so they aren't garbage collected
+_acknowledgements = set()
+
+async def show_resolutions(client, callback_query, encoded_name, series_name, after=None, before=None):
+    """Show available resolutions for a series (keyset-paged on the resolution)"""
     try:
-        cursor.execute("""
-            SELECT DISTINCT resolution
-            FROM files 
-            WHERE series_name = ? 
-            ORDER BY 
-                CASE 
-                    WHEN resolution = '1080p' THEN 1
-                    WHEN resolution = '720p' THEN 2
-                    WHEN resolution = '480p' THEN 3
-                    ELSE 4
-                END
-        """, (series_name,))
-        
-        resolutions = cursor.fetchall()
+        resolutions = await catalog.resolutions(series_name)
         
         if not resolutions:
             if hasattr(callback_query, 'answer'):
@@ -35,31 +34,44 @@ async def show_resolutions(client, callback_query, encoded_name, series_name):
                 await callback_query.reply("No files available for this series")
             return
 
+        page = paginate(
+            [resolution_sort_key(resolution) for resolution, _ in resolutions],
+            resolutions,
+            BROWSE_PAGE_SIZE,
+            after=resolution_sort_key(after) if after else None,
+            before=resolution_sort_key(before) if before else None
+        )
+
         buttons = []
-        for (resolution,) in resolutions:
-            # Get file count for this resolution
-            cursor.execute("SELECT COUNT(*) FROM files WHERE series_name = ? AND resolution = ?", 
-                         (series_name, resolution))
-            file_count = cursor.fetchone()[0]
-            
+        for resolution, file_count in page.items:
             button_text = f"{resolution} ({file_count} files)"
             buttons.append([
                 InlineKeyboardButton(button_text, callback_data=f"res_{encoded_name}_{resolution}")
             ])
         
+        if page.items:
+            nav = nav_row(
+                page,
+                f"rp_p_{encoded_name}_{page.items[0][0]}",
+                f"rp_n_{encoded_name}_{page.items[-1][0]}"
+            )
+            if nav:
+                buttons.append(nav)
+        
         # Add back button
         buttons.append([InlineKeyboardButton("Back to Series", callback_data="browse_series")])
         
         message_text = (
             f"**{series_name}**\n\n"
             f"Select Resolution:\n\n"
-            f"All episodes of the selected resolution will be sent to your DM automatically."
+            f"Then choose all episodes, the latest ones or a season to have them sent to your DM."
         )
         
         # Check if this is a callback query or regular message
         if hasattr(callback_query, 'message') and hasattr(callback_query, 'answer'):
             try:
-                await callback_query.message.edit_text(
+                await send_scheduler.edit(
+                    callback_query.message,
                     message_text,
                     parse_mode=enums.ParseMode.MARKDOWN,
                     reply_markup=InlineKeyboardMarkup(buttons)
@@ -81,184 +93,251 @@ async def show_resolutions(client, callback_query, encoded_name, series_name):
         else:
             await callback_query.reply("Error loading resolutions. Please try again.")
 
-async def send_all_episodes(client, user_id, series_name, resolution):
-    """Send all episodes of a resolution to user"""
+@app.on_callback_query(filters.regex(r"^rp_([np])_([^_]+)_(.+)$"))
+async def resolution_page_handler(client, callback_query):
+    """Page through resolutions: rp_n_<hash>_<resolution> / rp_p_<hash>_<resolution>"""
+    _, direction, encoded_name, resolution = callback_query.data.split('_', 3)
+    series_name = await decode_series_name(encoded_name)
+    if series_name == "Unknown Series":
+        await callback_query.answer("Invalid series selection", show_alert=True)
+        return
+    if direction == 'n':
+        await show_resolutions(client, callback_query, encoded_name, series_name, after=resolution)
+    else:
+        await show_resolutions(client, callback_query, encoded_name, series_name, before=resolution)
+
+def _episode_ranges(episode_nums, size=EPISODE_RANGE_SIZE):
+    """Split sorted episode numbers into (first, last) runs of up to `size` episodes"""
+    return [
+        (episode_nums[start], episode_nums[min(start + size, len(episode_nums)) - 1])
+        for start in range(0, len(episode_nums), size)
+    ]
+
+async def show_episode_picker(client, callback_query, encoded_name, series_name, resolution, after=None, before=None):
+    """Show what to send from a resolution: everything, the latest N or a season (keyset-paged on season)"""
     try:
-        # Get episodes data
-        cursor.execute("""
-            SELECT message_id, file_id, caption, season, episode, file_type, file_size, duration
-            FROM files 
-            WHERE series_name = ? AND resolution = ?
-            ORDER BY 
-                CASE WHEN season = '' THEN 1 ELSE 0 END,
-                CAST(SUBSTR(season, 2) AS INTEGER),
-                CASE WHEN episode = '' THEN 1 ELSE 0 END,
-                CAST(SUBSTR(episode, 2) AS INTEGER)
-        """, (series_name, resolution))
-        
-        episodes = cursor.fetchall()
-        
-        if not episodes:
-            return False, "No episodes found for this resolution."
+        total = dict(await catalog.resolutions(series_name)).get(resolution, 0)
+        if not total:
+            await callback_query.answer("No files available for this resolution", show_alert=True)
+            return
+
+        season_rows = await seasons(series_name, resolution)
+        page = paginate(
+            [season_num for season_num, _ in season_rows], season_rows, BROWSE_PAGE_SIZE, after=after, before=before
+        )
+
+        buttons = [
+            [InlineKeyboardButton(f"All episodes ({total} files)", callback_data=f"dl_{encoded_name}_{resolution}_all")],
+            [InlineKeyboardButton("Missing only", callback_data=f"dl_{encoded_name}_{resolution}_all+")]
+        ]
+        latest = [
+            InlineKeyboardButton(f"Latest {count}", callback_data=f"dl_{encoded_name}_{resolution}_L{count}")
+            for count in LATEST_CHOICES if count < total
+        ]
+        if latest:
+            buttons.append(latest)
+
+        for season_num, file_count in page.items:
+            buttons.append([
+                InlineKeyboardButton(
+                    f"Season {season_num} ({file_count} files)",
+                    callback_data=f"sea_{encoded_name}_{resolution}_{season_num}"
+                )
+            ])
+
+        if page.items:
+            nav = nav_row(
+                page,
+                f"sn_p_{encoded_name}_{resolution}_{page.items[0][0]}",
+                f"sn_n_{encoded_name}_{resolution}_{page.items[-1][0]}"
+            )
+            if nav:
+                buttons.append(nav)
+
+        buttons.append([InlineKeyboardButton("Back to Resolutions", callback_data=f"series_{encoded_name}")])
 
-        total_episodes = len(episodes)
-        sent_count = 0
-        errors = 0
-        
-        # Send initial message
         try:
-            progress_msg = await client.send_message(
-                user_id,
-                f"**Preparing {total_episodes} episodes of {series_name} ({resolution})...**\n\n"
-                f"Initializing... (0/{total_episodes})"
+            await send_scheduler.edit(
+                callback_query.message,
+                f"**{series_name}**\nResolution: {resolution}\n\n"
+                f"Select episodes to send to your DM:",
+                parse_mode=enums.ParseMode.MARKDOWN,
+                reply_markup=InlineKeyboardMarkup(buttons)
             )
-        except (UserIsBlocked, PeerIdInvalid):
-            return False, "Please start a chat with the bot first."
-
-        for index, episode_data in enumerate(episodes, 1):
-            message_id, file_id, caption, season, episode, file_type, file_size, duration = episode_data
-            
-            # Build caption for user
-            file_caption = f"**{series_name}** "
-            if season and episode:
-                file_caption += f"{season}{episode} "
-            elif season:
-                file_caption += f"{season} "
-            elif episode:
-                file_caption += f"{episode} "
-            
-            file_caption += f"{resolution}\n"      
-            file_caption += f"via @{client.me.username}"
-            
-            try:
-                # Copy message from database channel to remove "Forwarded from" badge
-                max_retries = 3
-                sent_message = None
-                
-                # Retry only the copying operation
-                for retry in range(max_retries):
-                    try:
-                        # Copy the message from database channel without forwarding badge
-                        sent_message = await client.copy_message(
-                            chat_id=user_id,
-                            from_chat_id=DATABASE_CHANNEL,
-                            message_id=message_id,
-                            caption=file_caption,
-                            parse_mode=enums.ParseMode.MARKDOWN
-                        )
-                        
-                        # If copying succeeded, break out of retry loop
-                        if sent_message:
-                            break
-                            
-                    except FloodWait as e:
-                        if retry == max_retries - 1:
-                            raise e
-                        wait_time = int(e.value) if hasattr(e, 'value') else 60
-                        logger.info(f"Flood wait for {wait_time} seconds, retrying...")
-                        await asyncio.sleep(wait_time)
-                    except Exception as e:
-                        if retry == max_retries - 1:
-                            raise e
-                        await asyncio.sleep(2)
-                
-                # Log download
-                log_download(user_id, series_name, file_id)
-                sent_count += 1
-                
-                # Update progress every 5 episodes or for the last one
-                if sent_count % 5 == 0 or sent_count == total_episodes:
-                    try:
-                        remaining_time = (total_episodes - sent_count) * 2
-                        await progress_msg.edit_text(
-                            f"**Sending {total_episodes} episodes of {series_name} ({resolution})...**\n\n"
-                            f"Progress: {sent_count}/{total_episodes} episodes sent\n"
-                            f"Errors: {errors}\n"
-                            f"Remaining: ~{remaining_time} seconds"
-                        )
-                    except Exception as e:
-                        logger.warning(f"Could not update progress message: {e}")
-                
-                # Small delay to avoid rate limits
-                await asyncio.sleep(2)
-                
-            except Exception as e:
-                logger.error(f"Error sending episode {index}: {e}")
-                errors += 1
-                # Continue with next episode even if one fails
-        
-        # Send completion message
-        if sent_count > 0:
-            success_message = (
-                f"**Forwarded!**\n"
+        except MessageNotModified:
+            pass
+
+    except Exception as e:
+        logger.error(f"Error showing episode picker: {e}")
+        await callback_query.answer("Error loading episodes", show_alert=True)
+
+async def show_season(client, callback_query, encoded_name, series_name, resolution, season_num, after=None, before=None):
+    """Show a season as a whole plus episode ranges of EPISODE_RANGE_SIZE (keyset-paged on first episode)"""
+    try:
+        ranges = _episode_ranges(await season_episodes(series_name, resolution, season_num))
+        page = paginate([first for first, _ in ranges], ranges, BROWSE_PAGE_SIZE, after=after, before=before)
+
+        buttons = [[
+            InlineKeyboardButton(
+                f"Whole season S{season_num:02d}", callback_data=f"dl_{encoded_name}_{resolution}_S{season_num}"
+            ),
+            InlineKeyboardButton("Missing only", callback_data=f"dl_{encoded_name}_{resolution}_S{season_num}+")
+        ]]
+        row = []
+        for first, last in page.items:
+            episodes = EpisodeRange(season_num, first, last)
+            row.append(InlineKeyboardButton(
+                f"E{first:02d}–E{last:02d}" if first != last else f"E{first:02d}",
+                callback_data=f"dl_{encoded_name}_{resolution}_{episodes.code}"
+            ))
+            if len(row) == 2:
+                buttons.append(row)
+                row = []
+        if row:
+            buttons.append(row)
+
+        if page.items:
+            nav = nav_row(
+                page,
+                f"er_p_{encoded_name}_{resolution}_{season_num}_{page.items[0][0]}",
+                f"er_n_{encoded_name}_{resolution}_{season_num}_{page.items[-1][0]}"
             )
-            
-            if errors > 0:
-                success_message += "Some episodes failed to send. You can try selecting the resolution again to get the missing episodes.\n\n"
-            
-            success_message += "Enjoy your episodes!"
-            
-            try:
-                await progress_msg.edit_text(success_message)
-            except Exception as e:
-                await client.send_message(user_id, success_message)
-            
-            return True, f"Sent {sent_count}/{total_episodes} episodes"
-        else:
-            await progress_msg.edit_text("Failed to send any episodes. Please try again.")
-            return False, "All episodes failed to send"
-            
+            if nav:
+                buttons.append(nav)
+
+        buttons.append([InlineKeyboardButton("Back", callback_data=f"res_{encoded_name}_{resolution}")])
+
+        try:
+            await send_scheduler.edit(
+                callback_query.message,
+                f"**{series_name}**\nResolution: {resolution}\n\n"
+                f"Season {season_num}: send the whole season or a range of episodes.",
+                parse_mode=enums.ParseMode.MARKDOWN,
+                reply_markup=InlineKeyboardMarkup(buttons)
+            )
+        except MessageNotModified:
+            pass
+
     except Exception as e:
-        logger.error(f"Error in send_all_episodes: {e}")
-        return False, f"Error: {str(e)}"
+        logger.error(f"Error showing season: {e}")
+        await callback_query.answer("Error loading season", show_alert=True)
 
 @app.on_callback_query(filters.regex(r"^res_(.+)_(.+)$"))
 async def resolution_handler(client, callback_query):
-    """Handle resolution selection - send all episodes at once"""
+    """Handle resolution selection - show the episode picker"""
+    data_parts = callback_query.data.split('_')
+    if len(data_parts) < 3:
+        await callback_query.answer("Invalid selection", show_alert=True)
+        return
+    encoded_name = data_parts[1]
+    resolution = data_parts[2]
+    series_name = await decode_series_name(encoded_name)
+    if series_name == "Unknown Series":
+        await callback_query.answer("Invalid series selection", show_alert=True)
+        return
+    await show_episode_picker(client, callback_query, encoded_name, series_name, resolution)
+
+@app.on_callback_query(filters.regex(r"^sn_([np])_([^_]+)_([^_]+)_(\d+)$"))
+async def season_page_handler(client, callback_query):
+    """Page through seasons: sn_n_<hash>_<resolution>_<season> / sn_p_..."""
+    _, direction, encoded_name, resolution, season_num = callback_query.data.split('_')
+    series_name = await decode_series_name(encoded_name)
+    if series_name == "Unknown Series":
+        await callback_query.answer("Invalid series selection", show_alert=True)
+        return
+    cursor = {'after': int(season_num)} if direction == 'n' else {'before': int(season_num)}
+    await show_episode_picker(client, callback_query, encoded_name, series_name, resolution, **cursor)
+
+@app.on_callback_query(filters.regex(r"^sea_([^_]+)_([^_]+)_(\d+)$"))
+async def season_handler(client, callback_query):
+    """Handle season selection: sea_<hash>_<resolution>_<season>"""
+    _, encoded_name, resolution, season_num = callback_query.data.split('_')
+    series_name = await decode_series_name(encoded_name)
+    if series_name == "Unknown Series":
+        await callback_query.answer("Invalid series selection", show_alert=True)
+        return
+    await show_season(client, callback_query, encoded_name, series_name, resolution, int(season_num))
+
+@app.on_callback_query(filters.regex(r"^er_([np])_([^_]+)_([^_]+)_(\d+)_(\d+)$"))
+async def episode_range_page_handler(client, callback_query):
+    """Page through a season's episode ranges: er_n_<hash>_<resolution>_<season>_<episode> / er_p_..."""
+    _, direction, encoded_name, resolution, season_num, episode_num = callback_query.data.split('_')
+    series_name = await decode_series_name(encoded_name)
+    if series_name == "Unknown Series":
+        await callback_query.answer("Invalid series selection", show_alert=True)
+        return
+    cursor = {'after': int(episode_num)} if direction == 'n' else {'before': int(episode_num)}
+    await show_season(client, callback_query, encoded_name, series_name, resolution, int(season_num), **cursor)
+
+async def send_all_episodes(client, user_id, series_name, resolution, episodes=EpisodeRange()):
+    """Queue the episodes of a resolution (all of them or a range) for background delivery to user"""
     try:
-        data_parts = callback_query.data.split('_')
-        if len(data_parts) < 3:
+        status, job_id = await delivery_manager.request(client, user_id, series_name, resolution, episodes)
+        if status == 'empty':
+            if episodes.missing:
+                return False, "You already have every episode of this selection."
+            return False, "No episodes found for this selection."
+        if status == 'busy':
+            return False, (
+                f"You already have {delivery_manager.max_per_user} deliveries in progress. "
+                f"Please wait for one to finish."
+            )
+        if status == 'in_progress':
+            # Repeat request: point at the running delivery instead of starting another
+            progress = await delivery_manager.progress_text(job_id) if job_id else None
+            return True, "Already sending these episodes to your DM." + (f"\n\n{progress}" if progress else "")
+        return True, "Episodes are on their way to your DM."
+    except (UserIsBlocked, PeerIdInvalid):
+        return False, "Please start a chat with the bot first."
+    except Exception as e:
+        logger.error(f"Error in send_all_episodes: {e}")
+        return False, f"Error: {str(e)}"
+
+async def _acknowledge(client, picker_message, user_id, header, success, message):
+    """Show a download request's outcome on the picker message; a failure that can't be shown there is sent anew"""
+    try:
+        await send_scheduler.edit(
+            picker_message,
+            header + (message if success else f"Download Failed\n\n{message}"),
+            parse_mode=enums.ParseMode.MARKDOWN
+        )
+    except MessageNotModified:
+        pass
+    except Exception as e:
+        if success:
+            logger.warning(f"Could not edit message: {e}")
+            return
+        try:
+            await send_scheduler.send(user_id, client.send_message, user_id, header + f"Download Failed\n\n{message}")
+        except Exception as e:
+            logger.error(f"Error sending download failure to {user_id}: {e}")
+
+@app.on_callback_query(filters.regex(r"^dl_([^_]+)_([^_]+)_(.+)$"))
+async def download_handler(client, callback_query):
+    """Handle an episode selection: dl_<hash>_<resolution>_<range code> - queue it and return right away"""
+    try:
+        _, encoded_name, resolution, code = callback_query.data.split('_', 3)
+        episodes = EpisodeRange.parse(code)
+        if episodes is None:
             await callback_query.answer("Invalid selection", show_alert=True)
             return
-            
-        encoded_name = data_parts[1]
-        resolution = data_parts[2]
-        series_name = decode_series_name(encoded_name)
+        series_name = await decode_series_name(encoded_name)
         user_id = callback_query.from_user.id
-        
+
         await callback_query.answer(f"Preparing {series_name} ({resolution})...")
-        
-        # Edit message to show processing
-        try:
-            await callback_query.message.edit_text(
-                f"**{series_name}**\nResolution: {resolution}",
-           
-                parse_mode=enums.ParseMode.MARKDOWN
-            )
-        except MessageNotModified:
-            pass
-        except Exception as e:
-            logger.warning(f"Could not edit message: {e}")
-        
-        # Send all episodes
-        success, message = await send_all_episodes(client, user_id, series_name, resolution)
-        
-        if not success:
-            try:
-                await callback_query.message.edit_text(
-                    f"**{series_name}**\nResolution: {resolution}\n\n"
-                    f"Download Failed\n\n{message}",
-                    parse_mode=enums.ParseMode.MARKDOWN
-                )
-            except Exception as e:
-                await client.send_message(
-                    user_id,
-                    f"**{series_name}**\nResolution: {resolution}\n\n"
-                    f"Download Failed\n\n{message}"
-                )
-            
+
+        # Queue the episodes; a background delivery worker sends them
+        success, message = await send_all_episodes(client, user_id, series_name, resolution, episodes)
+        header = f"**{series_name}**\nResolution: {resolution}\nEpisodes: {episodes.label}\n\n"
+
+        # The edit waits on the user's chat budget, which their deliveries share, so it is
+        # sent in the background and the handler returns right away
+        task = asyncio.create_task(_acknowledge(client, callback_query.message, user_id, header, success, message))
+        _acknowledgements.add(task)
+        task.add_done_callback(_acknowledgements.discard)
+
     except (UserIsBlocked, PeerIdInvalid):
         await callback_query.answer("Please unblock the bot and start chat", show_alert=True)
     except Exception as e:
-        logger.error(f"Error in resolution handler: {e}")
-        await callback_query.answer("Error sending episodes", show_alert=True)
\ No newline at end of file
+        logger.error(f"Error in download handler: {e}")
+        await callback_query.answer("Error sending episodes", show_alert=True)
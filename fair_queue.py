@@ -0,0 +1,123 @@
+import asyncio
+from collections import deque
+
+class FairQueue:
+    """Weighted fair queueing (start-time fair queueing) over per-flow FIFO queues.
+
+    Each flow (a user) queues entries with a cost (API calls). Serving an
+    entry moves its flow's virtual clock on by cost / weight, and the flow
+    with the earliest clock goes next, so every backlogged flow gets sends
+    in proportion to its weight however much it has queued. A flow whose
+    entry is still being handled is skipped until `release`, which keeps
+    one flow's entries in order; its clock stands still meanwhile, so it is
+    next in line once released and weights hold however many workers take
+    entries at once.
+    """
+
+    def __init__(self):
+        self._flows = {}
+        self._weights = {}
+        # Virtual start time of each flow's next entry; kept while the flow is busy
+        self._clock = {}
+        # Start time of the entry served last; a newly backlogged flow starts here
+        self._virtual = 0.0
+        self._busy = set()
+        self._ready = asyncio.Event()
+
+    def push(self, flow, entry, cost=1, weight=1):
+        """Queue an entry at the back of its flow"""
+        queue = self._flows.get(flow)
+        if queue is None:
+            queue = self._flows[flow] = deque()
+            # A flow can't bank credit while idle, nor skip ahead of the time it already used
+            self._clock[flow] = max(self._virtual, self._clock.get(flow, 0.0))
+        self._weights[flow] = max(1, weight)
+        queue.append((entry, cost))
+        self._ready.set()
+
+    def remove(self, flow, predicate):
+        """Drop a flow's queued entries matching predicate; returns how many were dropped"""
+        queue = self._flows.get(flow)
+        if not queue:
+            return 0
+        kept = deque(item for item in queue if not predicate(item[0]))
+        dropped = len(queue) - len(kept)
+        if kept:
+            self._flows[flow] = kept
+        else:
+            self._forget(flow)
+        return dropped
+
+    def release(self, flow):
+        """Mark a flow's entry as handled so the flow can be served again"""
+        self._busy.discard(flow)
+        if flow not in self._flows:
+            self._clock.pop(flow, None)
+        self._ready.set()
+
+    def _forget(self, flow):
+        del self._flows[flow]
+        del self._weights[flow]
+        if flow not in self._busy:
+            del self._clock[flow]
+
+    def _pick(self):
+        ready = [flow for flow in self._flows if flow not in self._busy]
+        if not ready:
+            return None
+        # Ties go to the flow that was backlogged first
+        flow = min(ready, key=self._clock.__getitem__)
+        queue = self._flows[flow]
+        entry, cost = queue.popleft()
+        self._virtual = self._clock[flow]
+        self._clock[flow] += cost / self._weights[flow]
+        self._busy.add(flow)
+        if not queue:
+            self._forget(flow)
+        return flow, entry
+
+    async def get(self):
+        """Wait for the next (flow, entry) to serve; call release(flow) when done with it"""
+        while True:
+            picked = self._pick()
+            if picked:
+                return picked
+            self._ready.clear()
+            await self._ready.wait()
+
+    def backlog(self, flow):
+        """Total cost queued for a flow"""
+        return sum(cost for _, cost in self._flows.get(flow, ()))
+
+    def position(self, flow):
+        """1-based place of a flow in the service order; 0 while it is being served, None if idle"""
+        if flow in self._busy:
+            return 0
+        if flow not in self._flows:
+            return None
+        # Stable sort: equal clocks keep backlog order, as in _pick
+        ready = sorted((other for other in self._flows if other not in self._busy), key=self._clock.__getitem__)
+        return ready.index(flow) + 1
+
+    def finish_time(self, flow, rate):
+        """Seconds until a flow's backlog drains when `rate` cost units/second are shared fairly.
+
+        Fluid approximation: while the flow drains its backlog B at weight w,
+        each other flow f gets at most B * w_f / w of the budget (less if its
+        own backlog runs out first).
+        """
+        backlog = self.backlog(flow)
+        if not backlog:
+            return 0.0
+        weight = self._weights[flow]
+        share = sum(
+            min(self.backlog(other), backlog * self._weights[other] / weight) for other in self._flows
+        )
+        return share / rate
+
+    @property
+    def flows(self):
+        return len(self._flows)
+
+    def __len__(self):
+        return sum(len(queue) for queue in self._flows.values())
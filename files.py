@@ -1,7 +1,8 @@
 from pyrogram import filters, enums
 from pyrogram.types import Message
 from shared import app, ADMINS, DATABASE_CHANNEL
-from database import conn, cursor
+from database import execute, code_number
+from catalog import catalog
 from utils import encode_series_name, store_series_mapping
 import datetime
 import logging
@@ -150,21 +151,19 @@ async def add_file_handler(client, message: Message):
         # Store in database with the database message ID
         file_caption = build_file_caption(series_name, season, episode, resolution, file_info)
         
-        cursor.execute("""
-            INSERT INTO files (series_name, season, episode, resolution, file_id, 
-                             message_id, file_type, caption, file_size, duration)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-        """, (
+        await execute('files.insert', (
             series_name, season, episode, resolution,
             file_info['id'], db_message.id, file_info['type'],
             file_caption, format_file_size(file_info['size']),
-            format_duration(file_info['duration'])
+            format_duration(file_info['duration']),
+            code_number(season), code_number(episode),
+            file_info['size'] or None, file_info['duration'] or None
         ))
-        conn.commit()
+        catalog.add_file(series_name, resolution, file_info['size'])
 
         # Store series mapping
         encoded_name = encode_series_name(series_name)
-        store_series_mapping(series_name, encoded_name)
+        await store_series_mapping(series_name, encoded_name)
 
         # Format display for response
         season_episode = f"{season}{episode}" if season and episode else season or episode or "N/A"
@@ -264,13 +263,7 @@ async def list_files_handler(client, message):
         return
 
     try:
-        cursor.execute("""
-            SELECT series_name, resolution, COUNT(*) as file_count
-            FROM files 
-            GROUP BY series_name, resolution
-            ORDER BY series_name, resolution
-        """)
-        results = cursor.fetchall()
+        results = await catalog.rows()
         
         if not results:
             await message.reply("No files in database yet")
@@ -304,9 +297,8 @@ async def delete_series_handler(client, message):
             
         series_name = message.text.split(" ", 1)[1].strip().strip('"')
         
-        cursor.execute("DELETE FROM files WHERE series_name = ?", (series_name,))
-        deleted_count = cursor.rowcount
-        conn.commit()
+        deleted_count = await execute('files.delete_series', (series_name,))
+        catalog.remove_series(series_name)
         
         if deleted_count > 0:
             await message.reply(f"Deleted {deleted_count} files from '{series_name}'")
@@ -1,12 +1,20 @@
-from pyrogram import filters, enums
+from pyrogram import filters, enums, idle
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.errors import UserIsBlocked, PeerIdInvalid, MessageNotModified
 import logging
 from logging.handlers import RotatingFileHandler
 from pathlib import Path
-from database import cursor, conn
-from utils import encode_series_name, decode_series_name, store_series_mapping
-from shared import app, SPONSOR_CHANNEL, DATABASE_CHANNEL, MAIN_CHANNEL, ADMINS
+from database import close_database, pool_stats, TELEMETRY
+from query_stats import query_stats
+from utils import encode_series_name, decode_series_name, store_series_mapping, load_series_mappings
+from stats_writer import download_stats_writer
+from catalog import catalog
+from rollups import stats_rollup_job, get_download_totals
+from shared import app, SPONSOR_CHANNEL, DATABASE_CHANNEL, MAIN_CHANNEL, ADMINS, BROWSE_PAGE_SIZE
+from pager import nav_row
+from rate_limiter import send_scheduler
+from delivery import delivery_manager
+from delivery_pool import delivery_pool
 
 
 # Setup logging
@@ -24,10 +32,20 @@ formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
 rot_handler.setFormatter(formatter)
 logging.getLogger().addHandler(rot_handler)
 
+# Slow queries (with their plans) also go to their own file
+slow_handler = RotatingFileHandler(
+    str(log_file.with_name('slow_queries.log')), maxBytes=5*1024*1024, backupCount=3
+)
+slow_handler.setFormatter(formatter)
+logging.getLogger("slow_queries").addHandler(slow_handler)
+
 logger = logging.getLogger(__name__)
 # Import handlers after logging setup
 import files
 import episodes
+import search
+import backup
+from maintenance import maintenance_scheduler
 
 @app.on_message(filters.command("start"))
 async def start_handler(client, message):
@@ -65,7 +83,7 @@ Use the buttons below to get started!"""
     if is_admin:
         keyboard.append([InlineKeyboardButton("Admin Panel", callback_data="admin_panel")])
     
-    await message.reply(
+    await send_scheduler.reply(message,
         welcome_text,
         reply_markup=InlineKeyboardMarkup(keyboard),
         parse_mode=enums.ParseMode.MARKDOWN
@@ -77,11 +95,11 @@ async def handle_series_start(client, message, encoded_name):
         user_id = message.from_user.id
         logger.info(f"User {user_id} started with encoded name: {encoded_name}")
         
-        series_name = decode_series_name(encoded_name)
+        series_name = await decode_series_name(encoded_name)
         logger.info(f"Decoded series name: {series_name}")
         
         if series_name == "Unknown Series":
-            await message.reply("Invalid series link or series not found. Please try again from the main channel.")
+            await send_scheduler.reply(message, "Invalid series link or series not found. Please try again from the main channel.")
             return
         
         logger.info(f"User {user_id} started with series: {series_name}")
@@ -109,7 +127,7 @@ async def handle_series_start(client, message, encoded_name):
             
     except Exception as e:
         logger.error(f"Error in handle_series_start with encoded_name '{encoded_name}': {e}")
-        await message.reply("Error processing your request. Please try again or contact admin.")
+        await send_scheduler.reply(message, "Error processing your request. Please try again or contact admin.")
 
 async def ask_to_join_sponsor(client, message, encoded_name, series_name):
     """Ask user to join sponsor channel"""
@@ -129,7 +147,7 @@ async def ask_to_join_sponsor(client, message, encoded_name, series_name):
             [InlineKeyboardButton("I've Joined", callback_data=f"check_{encoded_name}")]
         ])
         
-        await message.reply(
+        await send_scheduler.reply(message,
             f"**{series_name}**\n\nPlease join our channel to access episodes:",
             reply_markup=keyboard,
             parse_mode=enums.ParseMode.MARKDOWN
@@ -151,14 +169,14 @@ async def send_resolutions_message(client, message, encoded_name, series_name):
                 self.from_user = message.from_user
                 
             async def reply(self, text, **kwargs):
-                return await message.reply(text, **kwargs)
+                return await send_scheduler.reply(message, text, **kwargs)
                 
         mock_callback = MockCallback(message)
         await episodes.show_resolutions(client, mock_callback, encoded_name, series_name)
         
     except Exception as e:
         logger.error(f"Error sending resolutions message: {e}")
-        await message.reply("Error loading series. Please try again.")
+        await send_scheduler.reply(message, "Error loading series. Please try again.")
 
 @app.on_message(filters.command("help"))
 async def help_handler(client, message):
@@ -167,6 +185,7 @@ async def help_handler(client, message):
 
 **For Users:**
 • Use /start to see available series
+• Use /search to find a series by name
 • Browse and select episodes
 • Files are sent to your private messages
 
@@ -175,6 +194,8 @@ async def help_handler(client, message):
 • /files - View all files in database
 • /stats - View bot statistics
 • /delete_series - Remove a series
+• /querystats - Database query timings
+• /backup - Back up the database
 
 **Supported File Types:**
 Documents, Videos, Audio, Animations
@@ -190,77 +211,165 @@ If you encounter issues:
         [InlineKeyboardButton("Main Menu", callback_data="main_menu")]
     ])
     
-    await message.reply(help_text, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
+    await send_scheduler.reply(message, help_text, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
 
 @app.on_message(filters.command("stats") & filters.private)
 async def stats_handler(client, message):
     """Bot statistics (Admin only)"""
     if message.from_user.id not in ADMINS:
-        await message.reply("Admin access required.")
+        await send_scheduler.reply(message, "Admin access required.")
         return
     
     try:
         # Get statistics
-        cursor.execute("SELECT COUNT(DISTINCT series_name) FROM files")
-        series_count = cursor.fetchone()[0]
+        series_count, files_count, total_size = await catalog.totals()
         
-        cursor.execute("SELECT COUNT(*) FROM files")
-        files_count = cursor.fetchone()[0]
+        downloads_count, users_count = await get_download_totals()
         
-        cursor.execute("SELECT COUNT(DISTINCT user_id) FROM download_stats")
-        result = cursor.fetchone()
-        users_count = result[0] if result else 0
-        
-        cursor.execute("SELECT COUNT(*) FROM download_stats")
-        result = cursor.fetchone()
-        downloads_count = result[0] if result else 0
+        writer_stats = download_stats_writer.stats()
+        db_stats = pool_stats()
+        telemetry_stats = pool_stats(TELEMETRY)
+        send_stats = send_scheduler.stats()
+        bot_lines = "\n".join(
+            f"• {bot['name']}: {'up' if bot['healthy'] else 'down'}, `{bot['sends']}` sent, "
+            f"`{bot['errors']}` errors, `{bot['failovers']}` failovers, `{bot['unreachable']}` unreachable users, "
+            f"`{bot['file_ids']}` cached file_ids"
+            for bot in delivery_pool.stats()
+        )
         
         stats_text = f"""**Bot Statistics**
 
 **Database:**
 • Series: `{series_count}`
 • Files: `{files_count}`
+• Total size: `{files.format_file_size(total_size)}`
 • Users: `{users_count}`
 • Downloads: `{downloads_count}`
 
+**Stats Writer:**
+• Buffered: `{writer_stats['depth']}`
+• Flushes: `{writer_stats['flushes']}` (failed: `{writer_stats['failed_flushes']}`, rows dropped: `{writer_stats['dropped_rows']}`)
+• Flush latency: `{writer_stats['last_flush_ms']:.1f} ms` (max `{writer_stats['max_flush_ms']:.1f} ms`)
+
+**Connections:**
+• Readers: `{db_stats['in_use']}/{db_stats['size']}` in use (peak `{db_stats['peak_in_use']}`)
+• Read waits: `{db_stats['waits']}` (avg `{db_stats['avg_wait_ms']:.1f} ms`, max `{db_stats['max_wait_ms']:.1f} ms`)
+• Write queue: `{db_stats['write_queue_depth']}` pending, `{db_stats['writes']}` done
+• Telemetry write queue: `{telemetry_stats['write_queue_depth']}` pending, `{telemetry_stats['writes']}` done
+
+**Sending:**
+• Deliveries: `{delivery_manager.running}` running, `{delivery_manager.sending}` sending, `{delivery_manager.queued}` sends queued, `{delivery_manager.coalesced}` duplicate requests joined
+• Messages sent: `{send_stats['sends']}`
+• FloodWaits: `{send_stats['flood_waits']}` (global pauses: `{send_stats['global_pauses']}`)
+• Paused chats: `{send_stats['paused_chats']}`, global pause: `{send_stats['global_paused_for']:.0f}s`
+
+**Delivery Bots:**
+{bot_lines}
+
 **Channels:**
 • Database: `{DATABASE_CHANNEL}`
 • Main: `{MAIN_CHANNEL or 'Not set'}`
 • Sponsor: `{SPONSOR_CHANNEL or 'Not set'}`"""
         
-        await message.reply(stats_text, parse_mode=enums.ParseMode.MARKDOWN)
+        await send_scheduler.reply(message, stats_text, parse_mode=enums.ParseMode.MARKDOWN)
         
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
-        await message.reply("Error generating statistics.")
+        await send_scheduler.reply(message, "Error generating statistics.")
+
+@app.on_message(filters.command("querystats") & filters.private)
+async def query_stats_handler(client, message):
+    """Show the most expensive queries (Admin only); `/querystats reset` clears them"""
+    if message.from_user.id not in ADMINS:
+        await send_scheduler.reply(message, "Admin access required.")
+        return
+    
+    if len(message.command) > 1 and message.command[1] == "reset":
+        query_stats.reset()
+        await send_scheduler.reply(message, "Query statistics reset.")
+        return
+    
+    summaries = query_stats.snapshot()[:10]
+    if not summaries:
+        await send_scheduler.reply(message, "No queries recorded yet.")
+        return
+    
+    lines = ["**Top Queries by Total Time**\n"]
+    for s in summaries:
+        lines.append(
+            f"`{s['name']}`\n"
+            f"  calls `{s['calls']}` • total `{s['total_ms']:.0f} ms` • "
+            f"p95 `{s['p95_ms']:.1f} ms` • rows/call `{s['avg_rows']:.1f}`"
+        )
+    
+    slow = list(query_stats.slow_log)[-5:]
+    if slow:
+        lines.append("\n**Recent Slow Queries**\n")
+        for entry in reversed(slow):
+            lines.append(f"`{entry['name']}` {entry['elapsed_ms']:.0f} ms\n  {' | '.join(entry['plan'])}")
+    
+    await send_scheduler.reply(message, "\n".join(lines), parse_mode=enums.ParseMode.MARKDOWN)
 
 @app.on_callback_query(filters.regex(r"^browse_series$"))
 async def browse_series_handler(client, callback_query):
-    """Show list of all available series"""
+    """Show the first page of available series"""
+    await show_series_page(callback_query)
+
+@app.on_callback_query(filters.regex(r"^bp_([npj])_(.+)$"))
+async def browse_page_handler(client, callback_query):
+    """Page through series: bp_n_<hash> (next), bp_p_<hash> (prev), bp_j_<letter> (jump)"""
+    _, direction, cursor_value = callback_query.data.split('_', 2)
+    if direction == 'j':
+        await show_series_page(callback_query, start_at=cursor_value)
+        return
+
+    series_name = await decode_series_name(cursor_value)
+    if series_name == "Unknown Series":
+        await show_series_page(callback_query)
+    elif direction == 'n':
+        await show_series_page(callback_query, after=series_name)
+    else:
+        await show_series_page(callback_query, before=series_name)
+
+async def show_series_page(callback_query, after=None, before=None, start_at=None):
+    """Render one keyset page of the series list"""
     try:
-        cursor.execute("""
-            SELECT series_name, COUNT(*) as file_count
-            FROM files 
-            GROUP BY series_name 
-            ORDER BY series_name
-        """)
-        series_list = cursor.fetchall()
+        page = await catalog.series_page(BROWSE_PAGE_SIZE, after=after, before=before, start_at=start_at)
         
-        if not series_list:
+        if not page.total:
             await callback_query.answer("No series available yet", show_alert=True)
             return
         
         buttons = []
-        for series_name, file_count in series_list:
+        for series_name, file_count in page.items:
             encoded_name = encode_series_name(series_name)
             button_text = f"{series_name} ({file_count} files)"
             buttons.append([InlineKeyboardButton(button_text, callback_data=f"series_{encoded_name}")])
         
+        if page.items:
+            nav = nav_row(
+                page,
+                f"bp_p_{encode_series_name(page.items[0][0])}",
+                f"bp_n_{encode_series_name(page.items[-1][0])}"
+            )
+            if nav:
+                buttons.append(nav)
+        
+        # A-Z jump buttons once the list no longer fits on one page
+        if page.total > BROWSE_PAGE_SIZE:
+            initials = await catalog.initials()
+            letters = [InlineKeyboardButton(letter, callback_data=f"bp_j_{letter}") for letter in initials]
+            buttons.extend(letters[i:i + 8] for i in range(0, len(letters), 8))
+        
         buttons.append([InlineKeyboardButton("Main Menu", callback_data="main_menu")])
         
+        text = "**Available Series**\n\nSelect a series to browse episodes:"
+        if page.total > BROWSE_PAGE_SIZE and page.items:
+            text += f"\n\nShowing {page.start + 1}-{page.end} of {page.total}"
+        
         try:
-            await callback_query.message.edit_text(
-                "**Available Series**\n\nSelect a series to browse episodes:",
+            await send_scheduler.edit(callback_query.message,
+                text,
                 parse_mode=enums.ParseMode.MARKDOWN,
                 reply_markup=InlineKeyboardMarkup(buttons)
             )
@@ -278,6 +387,7 @@ async def show_help_handler(client, callback_query):
 
 **For Users:**
 • Use /start to see available series
+• Use /search to find a series by name
 • Browse and select episodes
 • Files are sent to your private messages
 
@@ -286,6 +396,8 @@ async def show_help_handler(client, callback_query):
 • /files - View all files in database
 • /stats - View bot statistics
 • /delete_series - Remove a series
+• /querystats - Database query timings
+• /backup - Back up the database
 
 **Supported File Types:**
 Documents, Videos, Audio, Animations
@@ -302,7 +414,7 @@ If you encounter issues:
     ])
     
     try:
-        await callback_query.message.edit_text(
+        await send_scheduler.edit(callback_query.message,
             help_text, 
             parse_mode=enums.ParseMode.MARKDOWN, 
             reply_markup=keyboard
@@ -315,7 +427,7 @@ async def series_selected_handler(client, callback_query):
     """Handle series selection"""
     try:
         encoded_name = callback_query.data.split('_', 1)[1]
-        series_name = decode_series_name(encoded_name)
+        series_name = await decode_series_name(encoded_name)
         user_id = callback_query.from_user.id
         
         if series_name == "Unknown Series":
@@ -353,7 +465,9 @@ async def series_selected_handler(client, callback_query):
                 
                 # Try to send DM first
                 try:
-                    await client.send_message(
+                    await send_scheduler.send(
+                        user_id,
+                        client.send_message,
                         chat_id=user_id,
                         text=f"**{series_name}**\n\nPlease join our channel to access episodes:",
                         reply_markup=InlineKeyboardMarkup([
@@ -366,7 +480,7 @@ async def series_selected_handler(client, callback_query):
                 except (UserIsBlocked, PeerIdInvalid):
                     # Can't DM user, send in current chat
                     try:
-                        await callback_query.message.edit_text(
+                        await send_scheduler.edit(callback_query.message,
                             f"**{series_name}**\n\nPlease join our channel first:",
                             reply_markup=InlineKeyboardMarkup([
                                 [InlineKeyboardButton("Join Channel", url=invite_link)],
@@ -396,7 +510,7 @@ async def check_subscription_handler(client, callback_query):
     """Check if user joined sponsor channel"""
     try:
         encoded_name = callback_query.data.split('_', 1)[1]
-        series_name = decode_series_name(encoded_name)
+        series_name = await decode_series_name(encoded_name)
         user_id = callback_query.from_user.id
 
         if not SPONSOR_CHANNEL:
@@ -435,7 +549,7 @@ async def admin_panel_handler(client, callback_query):
     ])
     
     try:
-        await callback_query.message.edit_text(
+        await send_scheduler.edit(callback_query.message,
             "**Admin Panel**\n\nSelect an action:",
             parse_mode=enums.ParseMode.MARKDOWN,
             reply_markup=keyboard
@@ -479,7 +593,7 @@ Use the buttons below to get started!"""
         keyboard.append([InlineKeyboardButton("Admin Panel", callback_data="admin_panel")])
     
     try:
-        await callback_query.message.edit_text(
+        await send_scheduler.edit(callback_query.message,
             welcome_text,
             reply_markup=InlineKeyboardMarkup(keyboard),
             parse_mode=enums.ParseMode.MARKDOWN
@@ -494,27 +608,26 @@ Use the buttons below to get started!"""
 async def send_series_handler(client, message):
     """Post series to main channel (Admin only)"""
     if message.from_user.id not in ADMINS:
-        await message.reply("Admin access required.")
+        await send_scheduler.reply(message, "Admin access required.")
         return
 
     if not MAIN_CHANNEL:
-        await message.reply("Main channel not configured.")
+        await send_scheduler.reply(message, "Main channel not configured.")
         return
 
     try:
         if len(message.command) < 2:
-            await message.reply('Usage: `/sendseries "Series Name"`', parse_mode=enums.ParseMode.MARKDOWN)
+            await send_scheduler.reply(message, 'Usage: `/sendseries "Series Name"`', parse_mode=enums.ParseMode.MARKDOWN)
             return
             
         series_name = message.text.split(" ", 1)[1].strip().strip('"')
         encoded_name = encode_series_name(series_name)
         
         # Check if series exists
-        cursor.execute("SELECT COUNT(*) FROM files WHERE series_name = ?", (series_name,))
-        file_count = cursor.fetchone()[0]
+        file_count = await catalog.file_count(series_name)
         
         if file_count == 0:
-            await message.reply(f"No files found for '{series_name}'. Add files first.")
+            await send_scheduler.reply(message, f"No files found for '{series_name}'. Add files first.")
             return
 
         # Get bot username
@@ -532,7 +645,9 @@ Tap **Download** to get started"""
 
         # Send with image if replied to a photo
         if message.reply_to_message and message.reply_to_message.photo:
-            await client.send_photo(
+            await send_scheduler.send(
+                MAIN_CHANNEL,
+                client.send_photo,
                 MAIN_CHANNEL,
                 message.reply_to_message.photo.file_id,
                 caption=caption,
@@ -540,18 +655,20 @@ Tap **Download** to get started"""
                 parse_mode=enums.ParseMode.MARKDOWN
             )
         else:
-            await client.send_message(
+            await send_scheduler.send(
+                MAIN_CHANNEL,
+                client.send_message,
                 MAIN_CHANNEL,
                 caption,
                 reply_markup=keyboard,
                 parse_mode=enums.ParseMode.MARKDOWN
             )
             
-        await message.reply(f"Series posted to channel! ({file_count} files)")
+        await send_scheduler.reply(message, f"Series posted to channel! ({file_count} files)")
         
     except Exception as e:
         logger.error(f"Error sending series: {e}")
-        await message.reply(f"Error: {str(e)}")
+        await send_scheduler.reply(message, f"Error: {str(e)}")
 
 @app.on_message(filters.command("commands") & filters.private)
 async def commands_handler(client, message):
@@ -563,6 +680,7 @@ async def commands_handler(client, message):
 
 **👤 User Commands:**
 • `/start` - Start the bot and browse series
+• `/search` - Find a series by name
 • `/help` - Show help and bot information
 • `/commands` - Show this commands list
 
@@ -585,6 +703,8 @@ async def commands_handler(client, message):
 • `/stats` - View bot statistics
 • `/delete_series` - Remove a series and all its files
 • `/sendseries` - Post series to main channel
+• `/querystats` - Show the slowest database queries
+• `/backup` - Back up the database (`/backup upload` sends it to the database channel)
 
 **Admin Usage:**
 • Reply to a file with `/addfile Series Name | S01E01 | 720p`
@@ -600,8 +720,35 @@ async def commands_handler(client, message):
         [InlineKeyboardButton("📺 Browse Series", callback_data="browse_series")]
     ])
 
-    await message.reply(commands_text, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
+    await send_scheduler.reply(message, commands_text, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
+
+async def on_startup():
+    """Start background services once the client is connected"""
+    await catalog.load()
+    await load_series_mappings()
+    await download_stats_writer.start()
+    await stats_rollup_job.start()
+    await delivery_manager.start()
+    await maintenance_scheduler.start()
+
+async def on_shutdown():
+    """Stop background services, flush buffers and release resources"""
+    await maintenance_scheduler.stop()
+    await delivery_manager.stop()
+    await stats_rollup_job.stop()
+    await download_stats_writer.stop()
+    await close_database()
+
+async def run_bot():
+    """Start the client, wait for a stop signal, then shut down cleanly"""
+    await app.start()
+    await on_startup()
+    try:
+        await idle()
+    finally:
+        await on_shutdown()
+        await app.stop()
 
 if __name__ == "__main__":
     logger.info("TV Series Bot starting...")
-    app.run()
\ No newline at end of file
+    app.run(run_bot())
\ No newline at end of file
@@ -0,0 +1,209 @@
+import asyncio
+import logging
+import time
+from database import run_db, execute_query, DATABASE_FILES, CHECKPOINT_QUERIES, CATALOG
+from query_stats import query_stats
+from utils import cleanup_old_mappings
+from backup import scheduled_backup
+from delivery import cleanup_delivery_jobs
+from shared import (
+    app, CHECKPOINT_INTERVAL, OPTIMIZE_INTERVAL, ANALYZE_INTERVAL, VACUUM_INTERVAL,
+    MAPPING_CLEANUP_INTERVAL, DELIVERY_CLEANUP_INTERVAL, BACKUP_INTERVAL,
+    MAINTENANCE_QUIET_SECONDS, MAINTENANCE_MAX_LAG_MS
+)
+
+logger = logging.getLogger(__name__)
+
+# Full VACUUM only once this share of the file is free pages
+VACUUM_FREE_RATIO = 0.2
+
+class LoadMonitor:
+    """Tracks update activity and event loop lag to decide when the bot is quiet"""
+
+    def __init__(self, probe_interval=1.0):
+        self.probe_interval = probe_interval
+        self.last_activity = 0.0
+        self.loop_lag_ms = 0.0
+        self._task = None
+
+    def record_activity(self):
+        self.last_activity = time.monotonic()
+
+    def idle_for(self):
+        return time.monotonic() - self.last_activity
+
+    async def start(self):
+        if not self._task:
+            self._task = asyncio.create_task(self._probe())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe(self):
+        # A sleep that wakes late means handlers are hogging the loop
+        while True:
+            started = time.monotonic()
+            await asyncio.sleep(self.probe_interval)
+            lag_ms = max(0.0, (time.monotonic() - started - self.probe_interval) * 1000)
+            self.loop_lag_ms = 0.8 * self.loop_lag_ms + 0.2 * lag_ms
+
+    def busy_reason(self, quiet_seconds, max_lag_ms):
+        """Why maintenance should wait right now, or None when the bot is quiet"""
+        if self.idle_for() < quiet_seconds:
+            return f"updates in the last {quiet_seconds}s"
+        if self.loop_lag_ms > max_lag_ms:
+            return f"event loop lag {self.loop_lag_ms:.0f} ms"
+        query_p95 = query_stats.recent_p95_ms()
+        if query_p95 > max_lag_ms:
+            return f"query p95 {query_p95:.0f} ms"
+        return None
+
+load_monitor = LoadMonitor()
+
+@app.on_raw_update(group=-1)
+async def _track_activity(client, update, users, chats):
+    """Stamp every incoming update; runs ahead of and alongside the real handlers"""
+    load_monitor.record_activity()
+
+class MaintenanceJob:
+    def __init__(self, name, interval, func):
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.next_due = time.monotonic() + interval
+        self.runs = 0
+        self.last_duration_ms = 0.0
+        self.last_result = None
+
+class MaintenanceScheduler:
+    """Runs database housekeeping jobs on their intervals, but only when the bot is quiet.
+
+    While busy, checks back off exponentially. A job that has been deferred for
+    more than `max_defer_factor` times its interval runs anyway so the WAL
+    can't grow without bound under constant load.
+    """
+
+    def __init__(self, monitor, tick=15, max_backoff=300, max_defer_factor=4):
+        self.monitor = monitor
+        self.tick = tick
+        self.max_backoff = max_backoff
+        self.max_defer_factor = max_defer_factor
+        self.jobs = []
+        self._task = None
+
+    def add_job(self, name, interval, func):
+        """Register an async job; its return value is logged as the run's effect"""
+        if interval > 0:
+            self.jobs.append(MaintenanceJob(name, interval, func))
+
+    async def start(self):
+        if self._task:
+            return
+        await self.monitor.start()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Maintenance scheduler started with jobs: {', '.join(j.name for j in self.jobs)}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.monitor.stop()
+
+    async def _run(self):
+        delay = self.tick
+        while True:
+            await asyncio.sleep(delay)
+            now = time.monotonic()
+            due = [job for job in self.jobs if job.next_due <= now]
+            if not due:
+                delay = self.tick
+                continue
+
+            reason = self.monitor.busy_reason(MAINTENANCE_QUIET_SECONDS, MAINTENANCE_MAX_LAG_MS)
+            if reason:
+                overdue = [job for job in due if now - job.next_due > job.interval * self.max_defer_factor]
+                if not overdue:
+                    delay = min(self.max_backoff, delay * 2)
+                    logger.debug(f"Maintenance deferred ({reason}), next check in {delay}s")
+                    continue
+                logger.info(f"Running overdue maintenance despite load ({reason})")
+                due = overdue
+
+            delay = self.tick
+            for job in due:
+                await self.run_job(job)
+
+    async def run_job(self, job):
+        started = time.perf_counter()
+        try:
+            job.last_result = await job.func()
+            job.last_duration_ms = (time.perf_counter() - started) * 1000
+            logger.info(f"Maintenance {job.name}: {job.last_result} ({job.last_duration_ms:.0f} ms)")
+        except Exception as e:
+            job.last_result = f"failed: {e}"
+            logger.error(f"Maintenance {job.name} failed: {e}")
+        job.runs += 1
+        job.next_due = time.monotonic() + job.interval
+
+async def checkpoint_wal():
+    # TRUNCATE keeps the catalog WAL short for readers; telemetry uses PASSIVE so flushes never wait
+    results = []
+    for db in DATABASE_FILES:
+        busy, log_pages, checkpointed = await run_db(
+            execute_query, CHECKPOINT_QUERIES[db], fetch_one=True, db=db
+        )
+        results.append(f"{db} WAL {log_pages} pages, {checkpointed} checkpointed{' (busy)' if busy else ''}")
+    return "; ".join(results)
+
+async def optimize():
+    for db in DATABASE_FILES:
+        await run_db(execute_query, 'maintenance.optimize', fetch_all=True, db=db)
+    return "PRAGMA optimize done"
+
+async def analyze():
+    # Telemetry queries are rowid ranges; PRAGMA optimize keeps its statistics fresh enough
+    await run_db(execute_query, 'maintenance.analyze', db=CATALOG)
+    return "statistics refreshed"
+
+async def _vacuum_database(db):
+    page_count = (await run_db(execute_query, 'maintenance.page_count', fetch_one=True, db=db))[0]
+    free_pages = (await run_db(execute_query, 'maintenance.freelist_count', fetch_one=True, db=db))[0]
+    auto_vacuum = (await run_db(execute_query, 'maintenance.auto_vacuum', fetch_one=True, db=db))[0]
+    if auto_vacuum == 2:
+        await run_db(execute_query, 'maintenance.incremental_vacuum', fetch_all=True, db=db)
+        return f"{db}: incremental vacuum, {free_pages} free of {page_count} pages"
+    if page_count and free_pages / page_count >= VACUUM_FREE_RATIO:
+        await run_db(execute_query, 'maintenance.vacuum', db=db)
+        return f"{db}: VACUUM reclaimed ~{free_pages} of {page_count} pages"
+    return f"{db}: skipped, {free_pages} free of {page_count} pages"
+
+async def vacuum():
+    # Telemetry frees pages as retention prunes raw rows, so it is checked too
+    return "; ".join([await _vacuum_database(db) for db in DATABASE_FILES])
+
+async def cleanup_mappings():
+    deleted = await cleanup_old_mappings()
+    return f"{deleted} orphaned series mappings removed"
+
+async def cleanup_deliveries():
+    deleted = await cleanup_delivery_jobs()
+    return f"{deleted} finished delivery jobs removed"
+
+maintenance_scheduler = MaintenanceScheduler(load_monitor)
+maintenance_scheduler.add_job("wal_checkpoint", CHECKPOINT_INTERVAL, checkpoint_wal)
+maintenance_scheduler.add_job("optimize", OPTIMIZE_INTERVAL, optimize)
+maintenance_scheduler.add_job("analyze", ANALYZE_INTERVAL, analyze)
+maintenance_scheduler.add_job("vacuum", VACUUM_INTERVAL, vacuum)
+maintenance_scheduler.add_job("mapping_cleanup", MAPPING_CLEANUP_INTERVAL, cleanup_mappings)
+maintenance_scheduler.add_job("delivery_cleanup", DELIVERY_CLEANUP_INTERVAL, cleanup_deliveries)
+maintenance_scheduler.add_job("backup", BACKUP_INTERVAL, scheduled_backup)
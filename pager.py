@@ -0,0 +1,54 @@
+from bisect import bisect_left, bisect_right
+from typing import NamedTuple, Sequence, Any
+from pyrogram.types import InlineKeyboardButton
+
+class Page(NamedTuple):
+    """One page of a keyset-paginated listing"""
+    items: list
+    start: int
+    total: int
+
+    @property
+    def has_prev(self):
+        return self.start > 0
+
+    @property
+    def has_next(self):
+        return self.start + len(self.items) < self.total
+
+    @property
+    def end(self):
+        return self.start + len(self.items)
+
+def seek(keys: Sequence[Any], limit, after=None, before=None, start_at=None):
+    """Locate a page in a sorted key sequence by cursor instead of by offset.
+
+    `after` returns the page following that key, `before` the page ending
+    just before it and `start_at` the page beginning at the first key >= it
+    (used for A-Z jumps). The cursor key does not need to still exist.
+    Returns (start, end) indexes into `keys`; cost is O(log n + limit).
+    """
+    if before is not None:
+        end = bisect_left(keys, before)
+        return max(0, end - limit), end
+    if after is not None:
+        start = bisect_right(keys, after)
+    elif start_at is not None:
+        start = bisect_left(keys, start_at)
+    else:
+        start = 0
+    return start, min(len(keys), start + limit)
+
+def paginate(keys: Sequence[Any], items: Sequence[Any], limit, after=None, before=None, start_at=None):
+    """Page of `items` (parallel to sorted `keys`) positioned by cursor"""
+    start, end = seek(keys, limit, after=after, before=before, start_at=start_at)
+    return Page(list(items[start:end]), start, len(keys))
+
+def nav_row(page, prev_data, next_data):
+    """Prev/Next button row for a page (empty list when everything fits)"""
+    row = []
+    if page.has_prev:
+        row.append(InlineKeyboardButton("« Prev", callback_data=prev_data))
+    if page.has_next:
+        row.append(InlineKeyboardButton("Next »", callback_data=next_data))
+    return row
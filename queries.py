@@ -0,0 +1,276 @@
+"""
+Named SQL statements.
+
+Every runtime statement is defined here once and executed by name through
+database.py, which records per-query timing and routes it to the database
+that holds its tables. Schema setup and migrations in database.py are not
+listed.
+"""
+
+# Database per query-name prefix; unlisted prefixes run against the catalog.
+# maintenance.* is database-agnostic and runs on whichever writer executes it.
+QUERY_DATABASES = {
+    'downloads': 'telemetry',
+    'rollup': 'telemetry',
+    'maintenance': None,
+}
+
+def query_database(name):
+    """Database a named query runs against ('catalog', 'telemetry' or None)"""
+    return QUERY_DATABASES.get(name.split('.', 1)[0], 'catalog')
+
+QUERIES = {
+    # files
+    'files.insert': """
+        INSERT INTO files (series_name, season, episode, resolution, file_id,
+                         message_id, file_type, caption, file_size, duration,
+                         season_num, episode_num, size_bytes, duration_seconds)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """,
+    'files.delete_series': "DELETE FROM files WHERE series_name = ?",
+    'files.update_file_id': "UPDATE files SET file_id = ? WHERE message_id = ? AND file_id = ?",
+    # Season/episode pickers read idx_episode_order only. The "IS NULL" terms match its expression
+    # columns; a season is bounded as BETWEEN s AND s because "season_num = ?" lets SQLite fold
+    # "season_num IS NULL" to a constant and lose the index prefix
+    'files.seasons': """
+        SELECT season_num, COUNT(*)
+        FROM files
+        WHERE series_name = ? AND resolution = ? AND (season_num IS NULL) = 0
+        GROUP BY season_num
+        ORDER BY season_num
+    """,
+    'files.season_episodes': """
+        SELECT DISTINCT episode_num
+        FROM files
+        WHERE series_name = ? AND resolution = ? AND (season_num IS NULL) = 0 AND season_num BETWEEN ? AND ?
+          AND (episode_num IS NULL) = 0
+        ORDER BY episode_num
+    """,
+
+    # series_summary (trigger-maintained)
+    'summary.all': "SELECT series_name, resolution, file_count, total_size FROM series_summary",
+    'summary.series_file_count': """
+        SELECT COALESCE(SUM(file_count), 0) FROM series_summary WHERE series_name = ?
+    """,
+    'summary.series_list': """
+        SELECT series_name, SUM(file_count) as file_count,
+               COUNT(*) as resolution_count
+        FROM series_summary
+        GROUP BY series_name
+        ORDER BY series_name
+    """,
+
+    # series_mapping
+    'mapping.recent': "SELECT hash, series_name FROM series_mapping ORDER BY created_at DESC LIMIT ?",
+    'mapping.by_hash': "SELECT series_name FROM series_mapping WHERE hash = ?",
+    'mapping.upsert': "INSERT OR REPLACE INTO series_mapping (hash, series_name) VALUES (?, ?)",
+    'mapping.orphaned': "SELECT hash FROM series_mapping WHERE series_name NOT IN (SELECT DISTINCT series_name FROM files)",
+    'mapping.cleanup': """
+        DELETE FROM series_mapping
+        WHERE series_name NOT IN (SELECT DISTINCT series_name FROM files)
+    """,
+
+    # search
+    'search.series': """
+        SELECT series_name FROM series_fts WHERE series_fts MATCH ? ORDER BY rank LIMIT ? OFFSET ?
+    """,
+
+    # delivery jobs
+    'delivery.create_job': """
+        INSERT INTO delivery_jobs (user_id, series_name, resolution, scope) VALUES (?, ?, ?, ?)
+    """,
+    'delivery.create_items': """
+        INSERT INTO delivery_items (job_id, position, message_id, file_id, season, episode, file_type)
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY season_num IS NULL, season_num, episode_num IS NULL, episode_num, id),
+               message_id, file_id, season, episode, file_type
+        FROM files
+        WHERE series_name = ? AND resolution = ?
+    """,
+    'delivery.create_items_season': """
+        INSERT INTO delivery_items (job_id, position, message_id, file_id, season, episode, file_type)
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY episode_num IS NULL, episode_num, id),
+               message_id, file_id, season, episode, file_type
+        FROM files
+        WHERE series_name = ? AND resolution = ? AND (season_num IS NULL) = 0 AND season_num BETWEEN ? AND ?
+    """,
+    'delivery.create_items_range': """
+        INSERT INTO delivery_items (job_id, position, message_id, file_id, season, episode, file_type)
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY episode_num IS NULL, episode_num, id),
+               message_id, file_id, season, episode, file_type
+        FROM files
+        WHERE series_name = ? AND resolution = ? AND (season_num IS NULL) = 0 AND season_num BETWEEN ? AND ?
+          AND (episode_num IS NULL) = 0 AND episode_num BETWEEN ? AND ?
+    """,
+    # Last N of the send order by walking idx_episode_order backwards, then sent oldest first
+    'delivery.create_items_latest': """
+        INSERT INTO delivery_items (job_id, position, message_id, file_id, season, episode, file_type)
+        SELECT ?, ROW_NUMBER() OVER (ORDER BY season_num IS NULL, season_num, episode_num IS NULL, episode_num, id),
+               message_id, file_id, season, episode, file_type
+        FROM (
+            SELECT id, season_num, episode_num, message_id, file_id, season, episode, file_type
+            FROM files
+            WHERE series_name = ? AND resolution = ?
+            ORDER BY season_num IS NULL DESC, season_num DESC, episode_num IS NULL DESC, episode_num DESC, id DESC
+            LIMIT ?
+        )
+    """,
+    # Anti-join against the user's history by file_id (telemetry.download_received, plus
+    # the raw download_stats rows not rolled up into it yet) and their delivery items by
+    # message_id (catalog readers ATTACH telemetry)
+    'delivery.unsent_files': """
+        SELECT f.message_id
+        FROM files f
+        WHERE f.series_name = ? AND f.resolution = ?
+          AND NOT EXISTS (
+              SELECT 1 FROM telemetry.download_received r
+              WHERE r.user_id = ? AND r.series_name = f.series_name AND r.file_id = f.file_id
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM telemetry.download_stats d
+              WHERE d.user_id = ? AND d.series_name = f.series_name AND d.file_id = f.file_id
+          )
+          AND NOT EXISTS (
+              SELECT 1 FROM delivery_jobs j
+              JOIN delivery_items i ON i.job_id = j.id
+              WHERE j.user_id = ? AND j.series_name = f.series_name
+                AND i.message_id = f.message_id
+                AND (i.status = 'sent' OR (i.status = 'pending' AND j.status IN ('pending', 'running')))
+          )
+    """,
+    'delivery.drop_received_items': """
+        DELETE FROM delivery_items
+        WHERE job_id = ? AND message_id NOT IN (SELECT value FROM json_each(?))
+    """,
+    # Items the user's other unfinished jobs for the resolution still have to send
+    'delivery.drop_queued_items': """
+        DELETE FROM delivery_items
+        WHERE job_id = ? AND message_id IN (
+            SELECT i.message_id FROM delivery_jobs j
+            JOIN delivery_items i ON i.job_id = j.id
+            WHERE j.user_id = ? AND j.series_name = ? AND j.resolution = ? AND j.id != ?
+              AND j.status IN ('pending', 'running') AND i.status = 'pending'
+        )
+    """,
+    'delivery.set_total': "UPDATE delivery_jobs SET total = ? WHERE id = ?",
+    'delivery.delete_job': "DELETE FROM delivery_jobs WHERE id = ?",
+    'delivery.job': """
+        SELECT id, user_id, series_name, resolution, status, total, progress_message_id, scope
+        FROM delivery_jobs WHERE id = ?
+    """,
+    'delivery.unfinished_jobs': """
+        SELECT id, user_id, series_name, resolution, scope
+        FROM delivery_jobs WHERE status IN ('pending', 'running') ORDER BY id
+    """,
+    'delivery.set_status': """
+        UPDATE delivery_jobs SET status = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ?
+    """,
+    'delivery.set_progress_message': "UPDATE delivery_jobs SET progress_message_id = ? WHERE id = ?",
+    'delivery.pending_items': """
+        SELECT position, message_id, file_id, season, episode, file_type, attempts
+        FROM delivery_items
+        WHERE job_id = ? AND status = 'pending'
+        ORDER BY position
+    """,
+    'delivery.item_sent': """
+        UPDATE delivery_items SET status = 'sent', attempts = attempts + 1, file_id = ?
+        WHERE job_id = ? AND position = ?
+    """,
+    'delivery.item_attempt_failed': """
+        UPDATE delivery_items
+        SET attempts = attempts + 1,
+            last_error = ?,
+            status = CASE WHEN attempts + 1 >= ? THEN 'failed' ELSE 'pending' END
+        WHERE job_id = ? AND position = ?
+    """,
+    'delivery.counts': """
+        SELECT COALESCE(SUM(status = 'sent'), 0), COALESCE(SUM(status = 'failed'), 0), COUNT(*)
+        FROM delivery_items WHERE job_id = ?
+    """,
+    'delivery.prune_items': """
+        DELETE FROM delivery_items WHERE job_id IN (
+            SELECT id FROM delivery_jobs
+            WHERE status IN ('done', 'failed') AND updated_at < datetime('now', ?)
+        )
+    """,
+    'delivery.prune_jobs': """
+        DELETE FROM delivery_jobs
+        WHERE status IN ('done', 'failed') AND updated_at < datetime('now', ?)
+    """,
+
+    # download_stats
+    'downloads.insert': "INSERT INTO download_stats (user_id, series_name, file_id) VALUES (?, ?, ?)",
+    'downloads.count_after': "SELECT COUNT(*) FROM download_stats WHERE id > ?",
+    'downloads.next_batch': """
+        SELECT MAX(id), COUNT(*) FROM (SELECT id FROM download_stats WHERE id > ? ORDER BY id LIMIT ?)
+    """,
+    'downloads.prune': """
+        DELETE FROM download_stats WHERE id IN (
+            SELECT id FROM download_stats
+            WHERE downloaded_at < datetime('now', ?)
+              AND id <= (SELECT rolled_up_to FROM download_totals WHERE id = 1)
+            LIMIT ?
+        )
+    """,
+
+    # download rollups
+    'rollup.watermark': "SELECT rolled_up_to FROM download_totals WHERE id = 1",
+    'rollup.totals': "SELECT downloads, users, rolled_up_to FROM download_totals WHERE id = 1",
+    'rollup.total_downloads': "SELECT downloads FROM download_totals WHERE id = 1",
+    'rollup.series_downloads': "SELECT downloads FROM download_series_totals WHERE series_name = ?",
+    'rollup.daily_series': """
+        INSERT INTO download_daily_series (day, series_name, downloads)
+        SELECT date(downloaded_at), series_name, COUNT(*)
+        FROM download_stats WHERE id > ? AND id <= ?
+        GROUP BY date(downloaded_at), series_name
+        ON CONFLICT(day, series_name) DO UPDATE SET downloads = downloads + excluded.downloads
+    """,
+    'rollup.daily_users': """
+        INSERT INTO download_daily_users (day, user_id, downloads)
+        SELECT date(downloaded_at), user_id, COUNT(*)
+        FROM download_stats WHERE id > ? AND id <= ?
+        GROUP BY date(downloaded_at), user_id
+        ON CONFLICT(day, user_id) DO UPDATE SET downloads = downloads + excluded.downloads
+    """,
+    'rollup.series_totals': """
+        INSERT INTO download_series_totals (series_name, downloads)
+        SELECT series_name, COUNT(*)
+        FROM download_stats WHERE id > ? AND id <= ?
+        GROUP BY series_name
+        ON CONFLICT(series_name) DO UPDATE SET downloads = downloads + excluded.downloads
+    """,
+    'rollup.new_users': """
+        SELECT COUNT(DISTINCT user_id) FROM download_stats
+        WHERE id > ? AND id <= ?
+          AND user_id NOT IN (SELECT user_id FROM download_users)
+    """,
+    'rollup.users': """
+        INSERT INTO download_users (user_id, first_seen, last_seen, downloads)
+        SELECT user_id, MIN(downloaded_at), MAX(downloaded_at), COUNT(*)
+        FROM download_stats WHERE id > ? AND id <= ?
+        GROUP BY user_id
+        ON CONFLICT(user_id) DO UPDATE SET
+            last_seen = excluded.last_seen,
+            downloads = downloads + excluded.downloads
+    """,
+    'rollup.received': """
+        INSERT OR IGNORE INTO download_received (user_id, series_name, file_id)
+        SELECT DISTINCT user_id, series_name, file_id
+        FROM download_stats WHERE id > ? AND id <= ?
+    """,
+    'rollup.advance': """
+        UPDATE download_totals
+        SET downloads = downloads + ?, users = users + ?, rolled_up_to = ?
+        WHERE id = 1
+    """,
+
+    # maintenance (run on the writer connection)
+    'maintenance.checkpoint': "PRAGMA wal_checkpoint(TRUNCATE)",
+    'maintenance.checkpoint_passive': "PRAGMA wal_checkpoint(PASSIVE)",
+    'maintenance.optimize': "PRAGMA optimize",
+    'maintenance.analyze': "ANALYZE",
+    'maintenance.auto_vacuum': "PRAGMA auto_vacuum",
+    'maintenance.page_count': "PRAGMA page_count",
+    'maintenance.freelist_count': "PRAGMA freelist_count",
+    'maintenance.incremental_vacuum': "PRAGMA incremental_vacuum(1000)",
+    'maintenance.vacuum': "VACUUM",
+}
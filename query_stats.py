@@ -0,0 +1,75 @@
+import threading
+from collections import deque
+
+class QueryStats:
+    """Thread-safe per-query counters fed by the database helpers"""
+
+    def __init__(self, sample_size=512, slow_log_size=50):
+        self.sample_size = sample_size
+        self._lock = threading.Lock()
+        self._queries = {}
+        self.slow_log = deque(maxlen=slow_log_size)
+
+    def record(self, name, elapsed, rows):
+        """Record one execution of a named query (elapsed in seconds)"""
+        with self._lock:
+            entry = self._queries.get(name)
+            if entry is None:
+                entry = self._queries[name] = {
+                    'calls': 0,
+                    'total': 0.0,
+                    'max': 0.0,
+                    'rows': 0,
+                    'samples': deque(maxlen=self.sample_size),
+                }
+            entry['calls'] += 1
+            entry['total'] += elapsed
+            entry['max'] = max(entry['max'], elapsed)
+            entry['rows'] += max(rows, 0)
+            entry['samples'].append(elapsed)
+
+    def record_slow(self, name, elapsed, params, plan):
+        """Keep a slow execution together with its query plan"""
+        with self._lock:
+            self.slow_log.append({
+                'name': name,
+                'elapsed_ms': elapsed * 1000,
+                'params': params,
+                'plan': plan,
+            })
+
+    def snapshot(self):
+        """Per-query summaries ordered by total time spent, most expensive first"""
+        with self._lock:
+            items = [(name, dict(entry), sorted(entry['samples'])) for name, entry in self._queries.items()]
+        summaries = []
+        for name, entry, samples in items:
+            p95 = samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0
+            summaries.append({
+                'name': name,
+                'calls': entry['calls'],
+                'total_ms': entry['total'] * 1000,
+                'avg_ms': entry['total'] / entry['calls'] * 1000,
+                'p95_ms': p95 * 1000,
+                'max_ms': entry['max'] * 1000,
+                'rows': entry['rows'],
+                'avg_rows': entry['rows'] / entry['calls'],
+            })
+        summaries.sort(key=lambda s: s['total_ms'], reverse=True)
+        return summaries
+
+    def recent_p95_ms(self):
+        """p95 latency over the recent samples of every query combined"""
+        with self._lock:
+            samples = sorted(s for entry in self._queries.values() for s in entry['samples'])
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1000
+
+    def reset(self):
+        with self._lock:
+            self._queries.clear()
+            self.slow_log.clear()
+
+# Process-wide query statistics
+query_stats = QueryStats()
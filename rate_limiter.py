@@ -0,0 +1,164 @@
+import asyncio
+import logging
+import time
+from collections import deque
+from pyrogram.errors import FloodWait
+from shared import SEND_GLOBAL_RATE, SEND_GLOBAL_BURST, SEND_CHAT_RATE, SEND_CHAT_BURST
+
+logger = logging.getLogger(__name__)
+
+class TokenBucket:
+    """Reservation-based token bucket; callers are served in arrival order"""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = max(1, capacity)
+        self.tokens = float(self.capacity)
+        # Refill runs from here; a pause moves it into the future
+        self.updated = time.monotonic()
+        # Total seconds pauses have pushed the refill back; waiters shift by the same amount
+        self.paused_total = 0.0
+
+    def _refill(self, now):
+        if now > self.updated:
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+
+    def reserve(self, now):
+        """Take a token and return how long to wait before using it"""
+        self._refill(now)
+        self.tokens -= 1
+        wait = max(0.0, self.updated - now)
+        if self.tokens < 0:
+            wait += -self.tokens / self.rate
+        return wait
+
+    def pause(self, seconds, now):
+        """Stop refilling for `seconds` and drop any saved-up burst"""
+        self._refill(now)
+        self.tokens = min(self.tokens, 0.0)
+        resume = max(self.updated, now + seconds)
+        self.paused_total += resume - self.updated
+        self.updated = resume
+
+    def paused_for(self, now):
+        return max(0.0, self.updated - now)
+
+    def idle(self, now):
+        """Full and not paused, so dropping it loses nothing"""
+        self._refill(now)
+        return self.tokens >= self.capacity and self.updated <= now
+
+class SendScheduler:
+    """Shared outgoing-message budget: a global token bucket plus one per chat.
+
+    Every send first waits for its chat's bucket, then for the global one, so
+    total throughput sits at the configured limit however many deliveries are
+    running. A FloodWait pauses the affected chat for everyone; FloodWaits
+    from several chats within `flood_window` seconds mean the bot-wide limit
+    was hit, so the global bucket is paused too.
+    """
+
+    def __init__(self, global_rate=SEND_GLOBAL_RATE, global_burst=SEND_GLOBAL_BURST,
+                 chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 max_retries=3, flood_window=10, max_chats=10000):
+        self.global_bucket = TokenBucket(global_rate, global_burst)
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.max_retries = max_retries
+        self.flood_window = flood_window
+        self.max_chats = max_chats
+        self._chats = {}
+        self._recent_floods = deque()
+        # Observability counters
+        self.sends = 0
+        self.flood_waits = 0
+        self.global_pauses = 0
+        self.total_wait = 0.0
+
+    def _chat_bucket(self, chat_id):
+        bucket = self._chats.get(chat_id)
+        if bucket is None:
+            if len(self._chats) >= self.max_chats:
+                self._evict_idle()
+            bucket = self._chats[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for chat_id in [chat_id for chat_id, bucket in self._chats.items() if bucket.idle(now)]:
+            del self._chats[chat_id]
+
+    async def _take(self, bucket):
+        delay = bucket.reserve(time.monotonic())
+        while delay > 0:
+            paused_total = bucket.paused_total
+            self.total_wait += delay
+            await asyncio.sleep(delay)
+            # A FloodWait that landed while we slept pushed the refill back; the token we
+            # reserved keeps its place in line and is due that much later
+            delay = bucket.paused_total - paused_total
+
+    async def acquire(self, chat_id):
+        """Wait until one more message to chat_id fits both budgets"""
+        await self._take(self._chat_bucket(chat_id))
+        await self._take(self.global_bucket)
+
+    def flood_wait(self, chat_id, seconds):
+        """Pause the scope a FloodWait came from"""
+        now = time.monotonic()
+        self.flood_waits += 1
+        self._chat_bucket(chat_id).pause(seconds, now)
+
+        self._recent_floods.append((now, chat_id))
+        while self._recent_floods and now - self._recent_floods[0][0] > self.flood_window:
+            self._recent_floods.popleft()
+        if len({flooded for _, flooded in self._recent_floods}) > 1:
+            self.global_pauses += 1
+            self.global_bucket.pause(seconds, now)
+            logger.warning(f"FloodWait across chats, pausing all sends for {seconds}s")
+        else:
+            logger.info(f"FloodWait for chat {chat_id}, pausing it for {seconds}s")
+
+    async def send(self, chat_id, func, /, *args, **kwargs):
+        """Await func(*args, **kwargs) within the budget, retrying after FloodWaits"""
+        for attempt in range(self.max_retries + 1):
+            await self.acquire(chat_id)
+            try:
+                result = await func(*args, **kwargs)
+                self.sends += 1
+                return result
+            except FloodWait as e:
+                self.flood_wait(chat_id, int(e.value) if hasattr(e, 'value') else 60)
+                if attempt == self.max_retries:
+                    raise
+
+    async def reply(self, message, /, *args, **kwargs):
+        """message.reply(...) within the budget of the message's chat"""
+        return await self.send(message.chat.id, message.reply, *args, **kwargs)
+
+    async def edit(self, message, /, *args, **kwargs):
+        """message.edit_text(...) within the budget of the message's chat"""
+        return await self.send(message.chat.id, message.edit_text, *args, **kwargs)
+
+    def estimate(self, chat_id, count):
+        """Rough seconds until `count` more messages to chat_id are sent"""
+        now = time.monotonic()
+        bucket = self._chats.get(chat_id)
+        paused = max(self.global_bucket.paused_for(now), bucket.paused_for(now) if bucket else 0.0)
+        return paused + count / min(self.chat_rate, self.global_bucket.rate)
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            'sends': self.sends,
+            'flood_waits': self.flood_waits,
+            'global_pauses': self.global_pauses,
+            'global_paused_for': self.global_bucket.paused_for(now),
+            'paused_chats': sum(1 for bucket in self._chats.values() if bucket.paused_for(now) > 0),
+            'tracked_chats': len(self._chats),
+            'total_wait': self.total_wait,
+        }
+
+# Process-wide scheduler shared by every outgoing send
+send_scheduler = SendScheduler()
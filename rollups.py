@@ -0,0 +1,96 @@
+import asyncio
+import logging
+import time
+from database import transaction, fetch_one, TELEMETRY
+from shared import STATS_ROLLUP_INTERVAL, STATS_RETENTION_DAYS
+
+logger = logging.getLogger(__name__)
+
+# Raw rows folded per transaction, so a large backlog never holds the write lock for long
+ROLLUP_BATCH_SIZE = 20000
+RETENTION_BATCH_SIZE = 5000
+
+def _rollup_batch(tx):
+    """Fold the next batch of raw download_stats rows into the rollup tables"""
+    watermark = tx.fetch_one('rollup.watermark')[0]
+    upper, count = tx.fetch_one('downloads.next_batch', (watermark, ROLLUP_BATCH_SIZE))
+    if not count:
+        return 0
+
+    bounds = (watermark, upper)
+    tx.execute('rollup.daily_series', bounds)
+    tx.execute('rollup.daily_users', bounds)
+    tx.execute('rollup.series_totals', bounds)
+    new_users = tx.fetch_one('rollup.new_users', bounds)[0]
+    tx.execute('rollup.users', bounds)
+    tx.execute('rollup.received', bounds)
+    tx.execute('rollup.advance', (count, new_users, upper))
+    return count
+
+def _prune_batch(tx, retention_days):
+    """Delete one batch of raw rows that are rolled up and past retention"""
+    return tx.execute('downloads.prune', (f"-{int(retention_days)} days", RETENTION_BATCH_SIZE))
+
+async def run_rollup(retention_days=STATS_RETENTION_DAYS):
+    """Roll up all pending raw rows, then prune raw rows past retention"""
+    started = time.perf_counter()
+    rolled = 0
+    while True:
+        count = await transaction(_rollup_batch, db=TELEMETRY)
+        rolled += count
+        if count < ROLLUP_BATCH_SIZE:
+            break
+
+    pruned = 0
+    if retention_days and retention_days > 0:
+        while True:
+            count = await transaction(lambda tx: _prune_batch(tx, retention_days), db=TELEMETRY)
+            pruned += count
+            if count < RETENTION_BATCH_SIZE:
+                break
+
+    if rolled or pruned:
+        logger.info(
+            f"Stats rollup: folded {rolled} rows, pruned {pruned} rows "
+            f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+        )
+    return rolled, pruned
+
+async def get_download_totals():
+    """(downloads, users) from the rollups plus the not-yet-rolled tail of downloads"""
+    downloads, users, watermark = await fetch_one('rollup.totals')
+    # Only rows newer than the watermark are counted, via a rowid range
+    pending = await fetch_one('downloads.count_after', (watermark,))
+    return downloads + pending[0], users
+
+class StatsRollupJob:
+    """Periodically folds download_stats into the rollup tables"""
+
+    def __init__(self, interval=STATS_ROLLUP_INTERVAL):
+        self.interval = interval
+        self._task = None
+
+    async def start(self):
+        if self._task:
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                await run_rollup()
+            except Exception as e:
+                logger.error(f"Stats rollup failed: {e}")
+            await asyncio.sleep(self.interval)
+
+# Process-wide rollup job
+stats_rollup_job = StatsRollupJob()
@@ -50,7 +50,7 @@ async def main():
     
     try:
         # Import and start the bot
-        from main import app, logger
+        from main import app, logger, on_startup, on_shutdown
         
         # Setup signal handlers for graceful shutdown
         def signal_handler(signum, frame):
@@ -66,6 +66,7 @@ async def main():
         
         # Run the bot
         await app.start()
+        await on_startup()
         
         # Keep the bot running
         import pyrogram
@@ -78,6 +79,7 @@ async def main():
         sys.exit(1)
     finally:
         try:
+            await on_shutdown()
             await app.stop()
         except:
             pass
@@ -0,0 +1,203 @@
+from pyrogram import filters, enums
+from pyrogram.types import (
+    InlineKeyboardMarkup, InlineKeyboardButton,
+    InlineQueryResultArticle, InputTextMessageContent
+)
+from pyrogram.errors import MessageNotModified
+from shared import app, ADMINS, BROWSE_PAGE_SIZE, INLINE_CACHE_TTL
+from database import fetch_all
+from utils import encode_series_name
+from catalog import catalog
+from collections import OrderedDict
+import logging
+import re
+import time
+
+logger = logging.getLogger(__name__)
+
+# Inline mode: results per answer (Telegram allows up to 50) and per cached query
+INLINE_PAGE_SIZE = 20
+INLINE_MAX_RESULTS = 200
+
+class QueryResultCache:
+    """Short-lived cache of search results keyed by normalized query text"""
+
+    def __init__(self, ttl, max_entries=5000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None or entry[0] < time.monotonic():
+            self._entries.pop(key, None)
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+inline_cache = QueryResultCache(INLINE_CACHE_TTL)
+
+def normalize_query(text):
+    """Lower-case and collapse whitespace so equivalent queries share a cache entry"""
+    return " ".join(text.lower().split())
+
+# Last search per user so page callbacks don't need to carry the query text
+_last_queries = OrderedDict()
+_MAX_REMEMBERED_QUERIES = 10000
+
+def build_match_query(text):
+    """Turn free text into an FTS5 expression: every token must match as a prefix"""
+    tokens = re.findall(r"\w+", text.lower())
+    if not tokens:
+        return None
+    return " ".join(f'"{token}"*' for token in tokens)
+
+async def search_series(text, limit, offset=0):
+    """Ranked series names matching text; returns (names, has_more)"""
+    match_query = build_match_query(text)
+    if not match_query:
+        return [], False
+    rows = await fetch_all('search.series', (match_query, limit + 1, offset))
+    names = [row[0] for row in rows]
+    return names[:limit], len(names) > limit
+
+def _remember_query(user_id, text):
+    _last_queries[user_id] = text
+    _last_queries.move_to_end(user_id)
+    while len(_last_queries) > _MAX_REMEMBERED_QUERIES:
+        _last_queries.popitem(last=False)
+
+async def build_results(user_id, offset):
+    """Text and keyboard for one page of a user's last search"""
+    text = _last_queries.get(user_id)
+    if not text:
+        return None, None
+
+    names, has_more = await search_series(text, BROWSE_PAGE_SIZE, offset)
+    if not names:
+        return f"No series found for `{text}`", None
+
+    buttons = []
+    for series_name in names:
+        file_count = await catalog.file_count(series_name)
+        buttons.append([InlineKeyboardButton(
+            f"{series_name} ({file_count} files)",
+            callback_data=f"series_{encode_series_name(series_name)}"
+        )])
+
+    nav = []
+    if offset > 0:
+        nav.append(InlineKeyboardButton("« Prev", callback_data=f"sp_{max(0, offset - BROWSE_PAGE_SIZE)}"))
+    if has_more:
+        nav.append(InlineKeyboardButton("Next »", callback_data=f"sp_{offset + BROWSE_PAGE_SIZE}"))
+    if nav:
+        buttons.append(nav)
+    buttons.append([InlineKeyboardButton("Browse All", callback_data="browse_series")])
+
+    header = f"**Search results for** `{text}`"
+    if user_id in ADMINS:
+        # Exact names for /sendseries and /delete_series
+        header += "\n\n" + "\n".join(f"• `{name}`" for name in names)
+    return header, InlineKeyboardMarkup(buttons)
+
+@app.on_message(filters.command("search") & filters.private)
+async def search_handler(client, message):
+    """Search series by name: /search <words>"""
+    if len(message.command) < 2:
+        await message.reply("Usage: `/search Series Name`", parse_mode=enums.ParseMode.MARKDOWN)
+        return
+
+    try:
+        user_id = message.from_user.id
+        _remember_query(user_id, message.text.split(" ", 1)[1].strip())
+        text, keyboard = await build_results(user_id, 0)
+        await message.reply(text, parse_mode=enums.ParseMode.MARKDOWN, reply_markup=keyboard)
+    except Exception as e:
+        logger.error(f"Error searching series: {e}")
+        await message.reply("Error searching series. Please try again.")
+
+@app.on_callback_query(filters.regex(r"^sp_(\d+)$"))
+async def search_page_handler(client, callback_query):
+    """Page through the user's last search results"""
+    try:
+        offset = int(callback_query.data.split('_', 1)[1])
+        text, keyboard = await build_results(callback_query.from_user.id, offset)
+        if text is None:
+            await callback_query.answer("Search expired, please search again", show_alert=True)
+            return
+        try:
+            await callback_query.message.edit_text(
+                text,
+                parse_mode=enums.ParseMode.MARKDOWN,
+                reply_markup=keyboard
+            )
+        except MessageNotModified:
+            pass
+    except Exception as e:
+        logger.error(f"Error paging search results: {e}")
+        await callback_query.answer("Error loading results", show_alert=True)
+
+async def inline_results(query_text):
+    """All series names for an inline query, served from the cache when warm"""
+    normalized = normalize_query(query_text)
+    # Keyed by catalog version too, so admin writes retire stale result sets
+    key = (catalog.version, normalized)
+    names = inline_cache.get(key)
+    if names is None:
+        if normalized:
+            names, _ = await search_series(normalized, INLINE_MAX_RESULTS)
+        else:
+            page = await catalog.series_page(INLINE_MAX_RESULTS)
+            names = [series_name for series_name, _ in page.items]
+        inline_cache.put(key, names)
+    return names
+
+@app.on_inline_query()
+async def inline_query_handler(client, inline_query):
+    """Answer @bot <text> with matching series that deep-link into the bot"""
+    try:
+        offset = int(inline_query.offset or 0)
+        names = await inline_results(inline_query.query)
+        page = names[offset:offset + INLINE_PAGE_SIZE]
+
+        results = []
+        for series_name in page:
+            encoded_name = encode_series_name(series_name)
+            file_count = await catalog.file_count(series_name)
+            results.append(InlineQueryResultArticle(
+                title=series_name,
+                description=f"{file_count} files",
+                input_message_content=InputTextMessageContent(
+                    f"**{series_name}**\n🍿Multiple Qualities🍿",
+                    parse_mode=enums.ParseMode.MARKDOWN
+                ),
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton(
+                        "Download Series",
+                        url=f"https://t.me/{client.me.username}?start=series_{encoded_name}"
+                    )
+                ]]),
+                id=encoded_name
+            ))
+
+        next_offset = offset + INLINE_PAGE_SIZE
+        await inline_query.answer(
+            results,
+            cache_time=INLINE_CACHE_TTL,
+            next_offset=str(next_offset) if next_offset < len(names) else ""
+        )
+    except Exception as e:
+        logger.error(f"Error answering inline query '{inline_query.query}': {e}")
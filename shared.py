@@ -33,6 +33,61 @@ if ADMINS_STR:
         logger.error("ADMINS must be comma-separated integers. Error: %s", e)
         raise
 
+# Download stats write-behind buffer: flush after this many rows or seconds, and keep at
+# most STATS_BUFFER_LIMIT rows while flushes fail (the oldest are dropped beyond it)
+STATS_FLUSH_BATCH = int(os.getenv("STATS_FLUSH_BATCH", "100"))
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "5"))
+STATS_BUFFER_LIMIT = int(os.getenv("STATS_BUFFER_LIMIT", "50000"))
+
+# Upper bound on series hash mappings kept in memory (LRU beyond this)
+SERIES_MAPPING_CACHE_SIZE = int(os.getenv("SERIES_MAPPING_CACHE_SIZE", "50000"))
+
+# Buttons per page on paginated browse screens
+BROWSE_PAGE_SIZE = int(os.getenv("BROWSE_PAGE_SIZE", "20"))
+
+# Seconds inline query results stay cached (locally and on Telegram's side)
+INLINE_CACHE_TTL = int(os.getenv("INLINE_CACHE_TTL", "60"))
+
+# download_stats rollups: how often to fold raw rows, and how long raw rows are kept
+STATS_ROLLUP_INTERVAL = int(os.getenv("STATS_ROLLUP_INTERVAL", "300"))
+STATS_RETENTION_DAYS = int(os.getenv("STATS_RETENTION_DAYS", "90"))
+
+# Database maintenance: job intervals (seconds) and when the bot counts as busy
+CHECKPOINT_INTERVAL = int(os.getenv("CHECKPOINT_INTERVAL", "600"))
+OPTIMIZE_INTERVAL = int(os.getenv("OPTIMIZE_INTERVAL", "3600"))
+ANALYZE_INTERVAL = int(os.getenv("ANALYZE_INTERVAL", "86400"))
+VACUUM_INTERVAL = int(os.getenv("VACUUM_INTERVAL", "86400"))
+MAPPING_CLEANUP_INTERVAL = int(os.getenv("MAPPING_CLEANUP_INTERVAL", "86400"))
+MAINTENANCE_QUIET_SECONDS = int(os.getenv("MAINTENANCE_QUIET_SECONDS", "30"))
+MAINTENANCE_MAX_LAG_MS = float(os.getenv("MAINTENANCE_MAX_LAG_MS", "100"))
+
+# Online backups: how often to snapshot (seconds, 0 disables) and how many to keep
+BACKUP_INTERVAL = int(os.getenv("BACKUP_INTERVAL", "86400"))
+BACKUP_KEEP = int(os.getenv("BACKUP_KEEP", "7"))
+
+# Outgoing message budget (messages/second and burst), bot-wide and per chat
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "25"))
+SEND_GLOBAL_BURST = int(os.getenv("SEND_GLOBAL_BURST", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = int(os.getenv("SEND_CHAT_BURST", "3"))
+
+# Delivery jobs: concurrent sends, active jobs per user, send attempts per episode,
+# and how long finished jobs are kept
+DELIVERY_WORKERS = int(os.getenv("DELIVERY_WORKERS", "4"))
+DELIVERY_MAX_PER_USER = int(os.getenv("DELIVERY_MAX_PER_USER", "2"))
+DELIVERY_MAX_ATTEMPTS = int(os.getenv("DELIVERY_MAX_ATTEMPTS", "3"))
+DELIVERY_JOB_RETENTION_DAYS = int(os.getenv("DELIVERY_JOB_RETENTION_DAYS", "7"))
+DELIVERY_CLEANUP_INTERVAL = int(os.getenv("DELIVERY_CLEANUP_INTERVAL", "86400"))
+
+# Admins' share of delivery sends relative to other users (1 = no priority)
+DELIVERY_ADMIN_WEIGHT = int(os.getenv("DELIVERY_ADMIN_WEIGHT", "1"))
+
+# Extra bot tokens (comma separated) used only to send deliveries; each must be able to read DATABASE_CHANNEL
+DELIVERY_BOT_TOKENS = [token.strip() for token in os.getenv("DELIVERY_BOT_TOKENS", "").split(",") if token.strip()]
+
+# "album" sends runs of same-type episodes as media groups of up to 10; "single" copies one by one
+DELIVERY_MODE = os.getenv("DELIVERY_MODE", "album").strip().lower()
+
 # normalize channel identifiers (strip leading @ or convert to int when possible)
 def _normalize_channel(val):
     if not val:
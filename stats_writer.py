@@ -0,0 +1,134 @@
+import asyncio
+import logging
+import time
+from database import transaction, TELEMETRY
+from shared import STATS_FLUSH_BATCH, STATS_FLUSH_INTERVAL, STATS_BUFFER_LIMIT
+
+logger = logging.getLogger(__name__)
+
+class DownloadStatsWriter:
+    """Write-behind buffer for download_stats rows.
+
+    Producers call add() without touching SQLite. A background task flushes
+    the buffer in a single executemany transaction once it reaches
+    batch_size rows or flush_interval seconds have passed. Rows of a failed
+    flush are retried, but at most max_buffer rows are kept: while the
+    database stays unavailable the oldest are dropped.
+    """
+
+    def __init__(self, batch_size=STATS_FLUSH_BATCH, flush_interval=STATS_FLUSH_INTERVAL,
+                 max_buffer=STATS_BUFFER_LIMIT):
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval
+        self.max_buffer = max(self.batch_size, max_buffer)
+        self._buffer = []
+        # Rows dropped since the last warning about it
+        self._unreported_drops = 0
+        self._wakeup = None
+        self._task = None
+        self._flush_lock = None
+        # Observability counters
+        self.flush_count = 0
+        self.rows_flushed = 0
+        self.failed_flushes = 0
+        self.dropped_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def add(self, user_id, series_name, file_id):
+        """Queue one download row; never blocks"""
+        self._buffer.append((user_id, series_name, file_id))
+        self._trim()
+        if len(self._buffer) >= self.batch_size and self._wakeup:
+            self._wakeup.set()
+
+    def _trim(self):
+        overflow = len(self._buffer) - self.max_buffer
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped_rows += overflow
+            self._unreported_drops += overflow
+
+    @property
+    def depth(self):
+        """Rows waiting to be written"""
+        return len(self._buffer)
+
+    async def start(self):
+        """Start the background flush task"""
+        if self._task:
+            return
+        self._wakeup = asyncio.Event()
+        self._flush_lock = asyncio.Lock()
+        self._task = asyncio.create_task(self._run())
+        logger.info(f"Download stats writer started (batch={self.batch_size}, interval={self.flush_interval}s)")
+
+    async def stop(self):
+        """Stop the background task and flush whatever is left"""
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+        logger.info(f"Download stats writer stopped ({self.rows_flushed} rows written)")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Write all buffered rows in one transaction"""
+        if not self._buffer:
+            return 0
+        lock = self._flush_lock or asyncio.Lock()
+        async with lock:
+            batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            started = time.perf_counter()
+            try:
+                await transaction(lambda tx: tx.executemany('downloads.insert', batch), db=TELEMETRY)
+            except Exception as e:
+                # Put the rows back so the next flush retries them, within the buffer limit
+                self._buffer[:0] = batch
+                self._trim()
+                self.failed_flushes += 1
+                logger.error(f"Error flushing {len(batch)} download stats rows: {e}")
+                if self._unreported_drops:
+                    logger.warning(
+                        f"Download stats buffer full ({self.max_buffer} rows), "
+                        f"dropped {self._unreported_drops} oldest rows"
+                    )
+                    self._unreported_drops = 0
+                return 0
+
+            elapsed_ms = (time.perf_counter() - started) * 1000
+            self.flush_count += 1
+            self.rows_flushed += len(batch)
+            self.last_flush_ms = elapsed_ms
+            self.max_flush_ms = max(self.max_flush_ms, elapsed_ms)
+            logger.debug(f"Flushed {len(batch)} download stats rows in {elapsed_ms:.1f} ms")
+            return len(batch)
+
+    def stats(self):
+        """Snapshot of buffer depth and flush latency"""
+        return {
+            'depth': self.depth,
+            'flushes': self.flush_count,
+            'rows_flushed': self.rows_flushed,
+            'failed_flushes': self.failed_flushes,
+            'dropped_rows': self.dropped_rows,
+            'last_flush_ms': self.last_flush_ms,
+            'max_flush_ms': self.max_flush_ms,
+        }
+
+# Process-wide writer instance
+download_stats_writer = DownloadStatsWriter()
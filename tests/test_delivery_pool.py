@@ -0,0 +1,73 @@
+import asyncio
+import time
+from collections import deque
+import pytest
+
+pytest.importorskip("pyrogram")
+
+from pyrogram.errors import FloodWait
+from delivery_pool import DeliveryBot, DeliveryPool
+from rate_limiter import SendScheduler
+
+# Sends/second a fake token allows, and the budget its scheduler keeps to
+TOKEN_LIMIT = 40
+RATE = 35
+
+class FakeClient:
+    """Send-only client that enforces a per-token limit the way Telegram does, with FloodWaits"""
+
+    def __init__(self, rate=TOKEN_LIMIT):
+        self.rate = rate
+        self.sent = []
+        self._recent = deque()
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        now = time.monotonic()
+        while self._recent and now - self._recent[0] >= 1:
+            self._recent.popleft()
+        if len(self._recent) >= self.rate:
+            raise FloodWait(value=1)
+        self._recent.append(now)
+        self.sent.append((chat_id, message_id))
+
+def _bot(name, primary=False, **kwargs):
+    # No per-chat cap, so only the token's own budget limits it
+    scheduler = SendScheduler(global_rate=RATE, global_burst=1, chat_rate=1000, chat_burst=1000)
+    return DeliveryBot(name, FakeClient(), scheduler, primary=primary, **kwargs)
+
+async def _send_all(pool, users):
+    async def send(user_id):
+        bot = pool.route(user_id)[0]
+        await bot.scheduler.send(user_id, bot.client.copy_message, chat_id=user_id, from_chat_id=0, message_id=1)
+
+    started = time.monotonic()
+    await asyncio.gather(*(send(user_id) for user_id in users))
+    return time.monotonic() - started
+
+def test_users_are_sharded_across_bots():
+    pool = DeliveryPool([_bot("primary", primary=True), _bot("worker1"), _bot("worker2")])
+    assert [pool.route(user_id)[0].name for user_id in range(6)] == [
+        "primary", "worker1", "worker2", "primary", "worker1", "worker2"
+    ]
+    assert [bot.name for bot in pool.route(1)] == ["worker1", "worker2", "primary"]
+    assert [bot.name for bot in pool.route(3)] == ["primary"]
+
+def test_extra_tokens_add_throughput_within_each_tokens_limit():
+    users = range(60)
+    single = DeliveryPool([_bot("primary", primary=True)])
+    sharded = DeliveryPool([_bot("primary", primary=True), _bot("worker1"), _bot("worker2")])
+    single_time = asyncio.run(_send_all(single, users))
+    sharded_time = asyncio.run(_send_all(sharded, users))
+
+    assert sharded_time < single_time * 0.6
+    for bot in single.bots + sharded.bots:
+        assert bot.scheduler.flood_waits == 0
+    assert [len(bot.client.sent) for bot in sharded.bots] == [20, 20, 20]
+
+def test_route_skips_failing_and_unreachable_bots():
+    pool = DeliveryPool([_bot("primary", primary=True), _bot("worker1", failure_threshold=1), _bot("worker2")])
+    pool.bots[1].record_failure(RuntimeError("down"))
+    assert [bot.name for bot in pool.route(1)] == ["worker2", "primary"]
+    pool.bots[2].mark_unreachable(1)
+    assert [bot.name for bot in pool.route(1)] == ["primary"]
+    assert pool.rate() == 2 * RATE
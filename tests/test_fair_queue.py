@@ -0,0 +1,72 @@
+import asyncio
+from collections import Counter
+from fair_queue import FairQueue
+
+def _drive(queue, workers, sends):
+    """Serve `sends` entries with `workers` concurrent tasks; returns the flows in service order"""
+    served = []
+
+    async def worker():
+        while len(served) < sends:
+            flow, entry = await queue.get()
+            served.append((flow, entry))
+            # Stand in for the API call, so the other workers run while this flow is busy
+            for _ in range(3):
+                await asyncio.sleep(0)
+            queue.release(flow)
+
+    async def run():
+        tasks = [asyncio.create_task(worker()) for _ in range(workers)]
+        while len(served) < sends:
+            await asyncio.sleep(0)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    asyncio.run(run())
+    return served[:sends]
+
+def _backlogged_queue(users=12, entries=100, admin_weight=3):
+    queue = FairQueue()
+    for index in range(entries):
+        queue.push('admin', index, weight=admin_weight)
+        for user in range(users):
+            queue.push(f'user{user}', index)
+    return queue
+
+def _shares(served, users=12):
+    counts = Counter(flow for flow, _ in served)
+    return counts['admin'], [counts[f'user{user}'] for user in range(users)]
+
+def test_weights_hold_with_one_worker():
+    admin, users = _shares(_drive(_backlogged_queue(), workers=1, sends=300))
+    assert admin == 3 * max(users)
+
+def test_weights_hold_with_several_workers():
+    # Fewer workers than flows, so the workers are what the flows compete for
+    for workers in (2, 3, 4):
+        admin, users = _shares(_drive(_backlogged_queue(), workers=workers, sends=300))
+        assert abs(admin - 3 * sum(users) / len(users)) <= 3, (workers, admin, users)
+        assert max(users) - min(users) <= 1
+
+def test_flow_entries_stay_in_order():
+    served = _drive(_backlogged_queue(users=3, entries=20), workers=4, sends=80)
+    for flow in ('admin', 'user0', 'user1', 'user2'):
+        entries = [entry for served_flow, entry in served if served_flow == flow]
+        assert entries == sorted(entries)
+
+def test_small_flow_is_not_stuck_behind_a_long_one():
+    queue = FairQueue()
+    for index in range(300):
+        queue.push('long', index)
+    for index in range(5):
+        queue.push('short', index)
+    served = _drive(queue, workers=2, sends=12)
+    assert [entry for flow, entry in served if flow == 'short'] == list(range(5))
+
+def test_position_counts_flows_ahead():
+    queue = FairQueue()
+    queue.push('a', 0)
+    queue.push('b', 0)
+    queue.push('c', 0, weight=2)
+    assert [queue.position(flow) for flow in ('a', 'b', 'c', 'd')] == [1, 2, 3, None]
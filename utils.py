@@ -1,26 +1,90 @@
 import hashlib
 import base64
 import sqlite3
-from database import cursor, conn
+from collections import OrderedDict
+from database import transaction, fetch_one, fetch_all, execute
+from stats_writer import download_stats_writer
+from shared import SERIES_MAPPING_CACHE_SIZE
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SeriesHashTable:
+    """Bounded two-way hash <-> series name lookup with LRU eviction"""
+
+    def __init__(self, capacity):
+        self.capacity = max(1, capacity)
+        self._by_hash = OrderedDict()
+        self._by_name = {}
+
+    def __len__(self):
+        return len(self._by_hash)
+
+    def get_name(self, encoded_hash):
+        series_name = self._by_hash.get(encoded_hash)
+        if series_name is not None:
+            self._by_hash.move_to_end(encoded_hash)
+        return series_name
+
+    def get_hash(self, series_name):
+        encoded_hash = self._by_name.get(series_name)
+        if encoded_hash is not None:
+            self._by_hash.move_to_end(encoded_hash)
+        return encoded_hash
+
+    def put(self, series_name, encoded_hash):
+        old_name = self._by_hash.pop(encoded_hash, None)
+        if old_name is not None and old_name != series_name:
+            self._by_name.pop(old_name, None)
+        self._by_hash[encoded_hash] = series_name
+        self._by_name[series_name] = encoded_hash
+        while len(self._by_hash) > self.capacity:
+            evicted_hash, evicted_name = self._by_hash.popitem(last=False)
+            if self._by_name.get(evicted_name) == evicted_hash:
+                del self._by_name[evicted_name]
+
+    def remove(self, encoded_hash):
+        series_name = self._by_hash.pop(encoded_hash, None)
+        if series_name is not None and self._by_name.get(series_name) == encoded_hash:
+            del self._by_name[series_name]
+
+# In-memory copy of series_mapping so callbacks resolve without a query
+series_hashes = SeriesHashTable(SERIES_MAPPING_CACHE_SIZE)
+
+async def load_series_mappings():
+    """Preload the most recent series mappings into memory"""
+    try:
+        rows = await fetch_all('mapping.recent', (series_hashes.capacity,))
+        # Insert oldest first so the newest mappings are the last to be evicted
+        for encoded_hash, series_name in reversed(rows):
+            series_hashes.put(series_name, encoded_hash)
+        logger.info(f"Loaded {len(series_hashes)} series mappings into memory")
+    except Exception as e:
+        logger.error(f"Error loading series mappings: {e}")
+
 def encode_series_name(series_name):
     """Generate a simple hash for series name"""
-    import hashlib
-    return hashlib.md5(series_name.encode('utf-8')).hexdigest()[:12]
+    encoded_hash = series_hashes.get_hash(series_name)
+    if encoded_hash is None:
+        encoded_hash = hashlib.md5(series_name.encode('utf-8')).hexdigest()[:12]
+        series_hashes.put(series_name, encoded_hash)
+    return encoded_hash
 
-def decode_series_name(encoded_hash):
+async def decode_series_name(encoded_hash):
     """Get series name from hash"""
     try:
         logger.debug(f"Attempting to decode hash: '{encoded_hash}'")
         
-        cursor.execute("SELECT series_name FROM series_mapping WHERE hash = ?", (encoded_hash,))
-        result = cursor.fetchone()
+        series_name = series_hashes.get_name(encoded_hash)
+        if series_name is not None:
+            return series_name
+        
+        # Cache miss (evicted or never loaded): fall back to the table
+        result = await fetch_one('mapping.by_hash', (encoded_hash,))
         
         if result:
             series_name = result[0]
+            series_hashes.put(series_name, encoded_hash)
             logger.debug(f"Successfully decoded '{encoded_hash}' -> '{series_name}'")
             return series_name
         else:
@@ -30,86 +94,72 @@ def decode_series_name(encoded_hash):
     except Exception as e:
         logger.error(f"Error decoding series name from hash '{encoded_hash}': {e}")
         return "Unknown Series"
-def store_series_mapping(series_name, encoded_hash):
+
+async def store_series_mapping(series_name, encoded_hash):
     """Store series name and hash mapping"""
     try:
         # Remove padding for consistent storage
         clean_hash = encoded_hash.rstrip('=')
-        cursor.execute(
-            "INSERT OR REPLACE INTO series_mapping (hash, series_name) VALUES (?, ?)",
-            (clean_hash, series_name)
-        )
-        conn.commit()
+        await execute('mapping.upsert', (clean_hash, series_name))
+        series_hashes.put(series_name, clean_hash)
         logger.debug(f"Stored mapping: {series_name} -> {clean_hash}")
     except Exception as e:
         logger.error(f"Error storing series mapping '{series_name}': {e}")
 
 def log_download(user_id, series_name, file_id):
-    """Log file downloads for statistics"""
+    """Log file downloads for statistics (buffered, flushed in batches)"""
     try:
-        cursor.execute(
-            "INSERT INTO download_stats (user_id, series_name, file_id) VALUES (?, ?, ?)",
-            (user_id, series_name, file_id)
-        )
-        conn.commit()
+        download_stats_writer.add(user_id, series_name, file_id)
         logger.debug(f"Logged download: user {user_id}, series {series_name}")
     except Exception as e:
         logger.error(f"Error logging download for user {user_id}: {e}")
 
-def get_series_stats(series_name=None):
-    """Get download statistics for a series or all series"""
+async def get_series_stats(series_name=None):
+    """Get download statistics for a series or all series (as of the last rollup)"""
     try:
         if series_name:
-            cursor.execute(
-                "SELECT COUNT(*) FROM download_stats WHERE series_name = ?",
-                (series_name,)
-            )
+            result = await fetch_one('rollup.series_downloads', (series_name,))
         else:
-            cursor.execute("SELECT COUNT(*) FROM download_stats")
+            result = await fetch_one('rollup.total_downloads')
         
-        result = cursor.fetchone()
         return result[0] if result else 0
     except Exception as e:
         logger.error(f"Error getting series stats: {e}")
         return 0
 
-def cleanup_old_mappings():
-    """Remove mappings for series that no longer exist"""
+def _cleanup_mappings(tx):
+    orphaned = [encoded_hash for encoded_hash, in tx.fetch_all('mapping.orphaned')]
+    if orphaned:
+        tx.execute('mapping.cleanup')
+    return orphaned
+
+async def cleanup_old_mappings():
+    """Remove mappings for series that no longer exist, from the table and the in-memory copy"""
     try:
-        cursor.execute("""
-            DELETE FROM series_mapping 
-            WHERE series_name NOT IN (SELECT DISTINCT series_name FROM files)
-        """)
-        deleted_count = cursor.rowcount
-        conn.commit()
-        if deleted_count > 0:
-            logger.info(f"Cleaned up {deleted_count} orphaned series mappings")
-        return deleted_count
+        orphaned = await transaction(_cleanup_mappings)
+        # Otherwise a removed series' hash would keep resolving from memory until restart
+        for encoded_hash in orphaned:
+            series_hashes.remove(encoded_hash)
+        if orphaned:
+            logger.info(f"Cleaned up {len(orphaned)} orphaned series mappings")
+        return len(orphaned)
     except Exception as e:
         logger.error(f"Error cleaning up mappings: {e}")
         return 0
 
-def validate_series_exists(series_name):
+async def validate_series_exists(series_name):
     """Check if a series has files in the database"""
     try:
-        cursor.execute("SELECT COUNT(*) FROM files WHERE series_name = ?", (series_name,))
-        result = cursor.fetchone()
+        result = await fetch_one('summary.series_file_count', (series_name,))
         return result[0] > 0 if result else False
     except Exception as e:
         logger.error(f"Error validating series '{series_name}': {e}")
         return False
 
-def get_all_series():
+async def get_all_series():
     """Get all series with file counts"""
     try:
-        cursor.execute("""
-            SELECT series_name, COUNT(*) as file_count, 
-                   COUNT(DISTINCT resolution) as resolution_count
-            FROM files 
-            GROUP BY series_name 
-            ORDER BY series_name
-        """)
-        return cursor.fetchall()
+        return await fetch_all('summary.series_list')
     except Exception as e:
         logger.error(f"Error getting all series: {e}")
         return []
\ No newline at end of file